@@ -0,0 +1,67 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+from secrets import token_hex
+
+import pytest
+
+from wheelchair.api import Database, AttachmentCache
+
+
+@pytest.mark.asyncio
+async def test_attachment_cache(new_database: Database, tmp_path):
+    cache = AttachmentCache(tmp_path / 'cache', max_size=150000)
+
+    stubs = []
+
+    for _ in range(2):
+        _id = token_hex()
+        data = token_hex(50000).encode()
+
+        res = await new_database.doc.put(_id, {})
+        await new_database.att.put(_id, 'my_data', 'application/octet-stream', data, rev=res['rev'])
+
+        doc = await new_database.doc(_id)
+        stubs.append((_id, doc['_attachments']['my_data']['digest'], data))
+
+    _id, digest, data = stubs[0]
+
+    assert cache.get(digest) is None
+
+    paths = await asyncio.gather(*(cache.fetch(new_database.att, _id, 'my_data', digest) for _ in range(5)))
+
+    assert len(set(paths)) == 1
+    assert cache.get(digest) == paths[0]
+
+    with open(paths[0], 'rb') as f:
+        assert f.read() == data
+
+    _id, digest, data = stubs[1]
+    await cache.fetch(new_database.att, _id, 'my_data', digest)
+
+    assert cache.get(stubs[0][1]) is None
+    assert cache.get(digest) is not None
+
+
+@pytest.mark.asyncio
+async def test_attachment_cache_compressed(new_database: Database, tmp_path):
+    cache = AttachmentCache(tmp_path / 'cache', max_size=150000)
+
+    _id = token_hex()
+    data = b'{"test": "' + b'data' * 10000 + b'"}'
+
+    res = await new_database.doc.put(_id, {})
+    await new_database.att.put(_id, 'my_data.json', 'application/json', data, rev=res['rev'])
+
+    doc = await new_database.doc(_id)
+    digest = doc['_attachments']['my_data.json']['digest']
+
+    path = await cache.fetch(new_database.att, _id, 'my_data.json', digest)
+
+    assert cache.get(digest) == path
+
+    with open(path, 'rb') as f:
+        assert f.read() == data
@@ -3,6 +3,8 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
+import asyncio
+
 import pytest
 
 from wheelchair.api import Database
@@ -43,3 +45,41 @@ async def test_bulk(new_database: Database):
         doc = docs['ok']
 
         assert doc['value'] in {1, 2, 3, 4, 5}
+
+
+@pytest.mark.asyncio
+async def test_bulk_update(new_database: Database):
+    await new_database.bulk.docs([dict(_id=f'doc{i}', value=i) for i in range(5)])
+
+    def increment(doc: dict) -> dict:
+        return dict(doc, value=doc.get('value', 0) + 1)
+
+    ids = [f'doc{i}' for i in range(6)]
+
+    results = await asyncio.gather(new_database.bulk.update(ids, increment, create=True),
+                                   new_database.bulk.update(ids, increment, create=True, retries=10))
+
+    assert all(row.get('ok') for res in results for row in res.values())
+
+    res = await new_database.all_docs(include_docs=True)
+
+    assert [row['doc']['value'] for row in res['rows']] == [2, 3, 4, 5, 6, 2]
+
+    res = await new_database.bulk.update(['missing'], increment)
+
+    assert res['missing']['error'] == 'not_found'
+
+
+@pytest.mark.asyncio
+async def test_bulk_skip_unchanged(new_database: Database):
+    res = await new_database.bulk.docs([dict(_id=f'doc{i}', value=i) for i in range(3)])
+    revs = {row['id']: row['rev'] for row in res}
+
+    docs = [dict(_id='doc0', value=0), dict(_id='doc1', value=100), dict(value=5), dict(_id='doc3', value=3)]
+    docs[1]['_rev'] = revs['doc1']
+
+    res = await new_database.bulk.docs(docs, skip_unchanged=True)
+
+    assert [row.get('skipped', False) for row in res] == [True, False, False, False]
+    assert res[0]['rev'] == revs['doc0']
+    assert all(row['ok'] for row in res)
@@ -0,0 +1,30 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+from wheelchair.api.utils import collation_key
+
+
+def test_collation_order():
+    values = [
+        None,
+        False,
+        True,
+        1,
+        2.5,
+        "a",
+        "b",
+        ["a"],
+        ["b", "c"],
+        {"a": 1},
+        {"b": 1},
+    ]
+
+    assert sorted(reversed(values), key=collation_key) == values
+
+
+def test_collation_nested():
+    assert collation_key([1, "a"]) < collation_key([1, "b"])
+    assert collation_key([1]) < collation_key([1, None])
+    assert collation_key({"a": 1}) < collation_key({"a": 2})
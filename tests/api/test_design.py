@@ -75,3 +75,30 @@ async def test_design_search(new_database: Database):
 @pytest.mark.asyncio
 async def test_design_update(new_database: Database):
     pass  # TODO: implement me!
+
+
+@pytest.mark.asyncio
+async def test_view_revalidate(new_database: Database):
+    map_func = "function (doc) {if (doc.type === 'doc') {emit(doc._id, doc.value);}}"
+    ddoc = {"views": {"my_docs": {"map": map_func}}}
+
+    await new_database.ddoc.put('my_docs', ddoc)
+    await new_database.post(dict(type='doc', value=1))
+
+    view = new_database.design('my_docs').view('my_docs')
+    res, etag = await view.revalidate(None, include_docs=True)
+
+    assert len(res['rows']) == 1
+    assert etag
+
+    res, same_etag = await view.revalidate(etag, include_docs=True)
+
+    assert res is None
+    assert same_etag == etag
+
+    await new_database.post(dict(type='doc', value=2))
+
+    res, new_etag = await view.revalidate(etag, include_docs=True)
+
+    assert len(res['rows']) == 2
+    assert new_etag != etag
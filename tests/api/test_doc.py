@@ -3,11 +3,13 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
+import asyncio
 from secrets import token_hex
 
 import pytest
 
-from wheelchair.api import Database, NotFoundError
+from wheelchair.api import Database, DocumentUpdateConflict, NotFoundError, MultipartAttachment
+from wheelchair.api.utils import canonical_hash
 
 
 @pytest.mark.asyncio
@@ -100,3 +102,156 @@ async def test_copy_to_exist(new_database: Database):
     assert res['_id'] == dst_id
     assert res['test_data1'] == doc['test_data1']
     assert res['test_data2'] == doc['test_data2']
+
+
+@pytest.mark.asyncio
+async def test_put_multipart(new_database: Database, tmp_path):
+    _id = token_hex()
+    doc = dict(test_data=token_hex())
+
+    file_data = token_hex(10000).encode()
+    path = tmp_path / 'file_data'
+    path.write_bytes(file_data)
+
+    async def loader():
+        yield b'Test '
+        yield b'data'
+
+    attachments = dict(
+        raw=MultipartAttachment('application/octet-stream', b'Raw data'),
+        file=MultipartAttachment('application/octet-stream', path),
+        stream=MultipartAttachment('text/plain', loader(), 9),
+    )
+
+    res = await new_database.doc.put_multipart(_id, doc, attachments)
+
+    assert res['id'] == _id
+    assert res['rev'].startswith('1-')
+
+    res = await new_database.doc(_id)
+
+    assert res['test_data'] == doc['test_data']
+    assert set(res['_attachments']) == {'raw', 'file', 'stream'}
+
+    for name, data in (('raw', b'Raw data'), ('file', file_data), ('stream', b'Test data')):
+        att = await new_database.att(_id, name)
+        assert await att.stream.read() == data
+
+
+@pytest.mark.asyncio
+async def test_doc_cache(new_database: Database):
+    connection = new_database.connection
+    cache = connection.enable_doc_cache(new_database.name, refresh=True)
+
+    try:
+        res = await new_database.doc.put('config', dict(value=1))
+
+        doc = await new_database.doc('config')
+
+        assert doc == dict(_id='config', _rev=res['rev'], value=1)
+        assert cache.stats.hits == 1
+
+        doc['value'] = 2
+        doc = await new_database.doc('config')
+
+        assert doc['value'] == 1
+
+        # Bulk writes invalidate the cached documents
+        await new_database.bulk.docs([dict(doc, value=3)])
+
+        doc = await new_database.doc('config')
+
+        assert doc['value'] == 3
+
+        # Changed bypassing the cache, the changes feed refreshes the cached document
+        await connection.query('PUT', [new_database.name, 'config'], data=dict(doc, value=4))
+
+        for _ in range(50):
+            if cache.stats.refreshes:
+                break
+            await asyncio.sleep(0.1)
+
+        doc = await new_database.doc('config')
+
+        assert doc['value'] == 4
+
+        await new_database.doc.delete('config', doc['_rev'])
+
+        assert 'config' not in cache
+
+        with pytest.raises(NotFoundError):
+            await new_database.doc('config')
+    finally:
+        connection.disable_doc_cache(new_database.name)
+
+
+@pytest.mark.asyncio
+async def test_revalidate(new_database: Database):
+    res = await new_database.doc.put('doc', dict(value=1))
+
+    doc, etag = await new_database.doc.revalidate('doc', None)
+
+    assert doc['value'] == 1
+    assert etag == f'"{res["rev"]}"'
+
+    doc, etag = await new_database.doc.revalidate('doc', etag)
+
+    assert doc is None
+    assert etag == f'"{res["rev"]}"'
+
+
+@pytest.mark.asyncio
+async def test_update(new_database: Database):
+    await new_database.doc.put('counter', dict(value=0))
+
+    def increment(doc: dict) -> dict:
+        return dict(doc, value=doc['value'] + 1)
+
+    await asyncio.gather(*(new_database.doc.update('counter', increment, retries=20) for _ in range(5)))
+
+    doc = await new_database.doc('counter')
+
+    assert doc['value'] == 5
+
+    assert await new_database.doc.update('counter', lambda doc: None) is None
+
+    res = await new_database.doc.update('new', lambda doc: dict(value=1), create=True)
+
+    assert res['ok']
+
+    with pytest.raises(NotFoundError):
+        await new_database.doc.update('missing', increment)
+
+
+def test_canonical_hash():
+    assert canonical_hash(dict(a=1, b=dict(c=2, d=3))) == canonical_hash(dict(b=dict(d=3, c=2), a=1))
+    assert canonical_hash(dict(_id='x', _rev='1-a', a=1)) == canonical_hash(dict(_id='x', _rev='2-b', a=1))
+    assert canonical_hash(dict(a=1)) != canonical_hash(dict(a=1.5))
+
+
+@pytest.mark.asyncio
+async def test_put_skip_unchanged(new_database: Database):
+    res = await new_database.doc.put('doc', dict(a=1, b=2))
+
+    skipped = await new_database.doc.put('doc', dict(b=2, a=1), skip_unchanged=True)
+
+    assert skipped == dict(ok=True, id='doc', rev=res['rev'], skipped=True)
+
+    res = await new_database.doc.put('doc', dict(a=2, b=2), rev=res['rev'], skip_unchanged=True)
+
+    assert 'skipped' not in res
+    assert res['rev'].startswith('2-')
+
+    connection = new_database.connection
+    connection.enable_doc_cache(new_database.name)
+
+    try:
+        res = await new_database.doc.put('cached', dict(a=1))
+
+        # The cached document is outdated, so the stored one is fetched and the write isn't skipped
+        await connection.query('PUT', [new_database.name, 'cached'], data=dict(a=2, _rev=res['rev']))
+
+        with pytest.raises(DocumentUpdateConflict):
+            await new_database.doc.put('cached', dict(a=1), skip_unchanged=True)
+    finally:
+        connection.disable_doc_cache(new_database.name)
@@ -0,0 +1,46 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import pytest
+
+from wheelchair.api import Database
+from wheelchair.api.database.find_profiler import query_shape
+
+
+def test_query_shape():
+    a = query_shape({'type': 'doc', 'value': {'$gt': 1}, '$or': [{'a': 1}, {'b': {'$in': [1, 2]}}]})
+    b = query_shape({'type': 'other', 'value': {'$gt': 5}, '$or': [{'a': 2}, {'b': {'$in': [3]}}]})
+
+    assert a == b
+    assert a == {'type': '?', 'value': {'$gt': '?'}, '$or': [{'a': '?'}, {'b': {'$in': '?'}}]}
+
+
+@pytest.mark.asyncio
+async def test_find_profiler(new_database: Database):
+    await new_database.post(dict(type='doc', value=1))
+    await new_database.post(dict(type='doc', value=2))
+    await new_database.post(dict(type='other_doc', value=3))
+
+    profiler = new_database.connection.enable_find_profiler()
+
+    try:
+        res = await new_database.find({'type': 'doc'})
+        assert 'execution_stats' not in res
+
+        await new_database.find({'type': 'other_doc'})
+        await new_database.find({'value': {'$gt': 1}})
+    finally:
+        new_database.connection.disable_find_profiler()
+
+    report = profiler.report()
+
+    assert len(report) == 2
+
+    shapes = {r['calls']: r for r in report}
+
+    assert shapes[2]['shape'] == {'type': '?'}
+    assert shapes[2]['results_returned'] == 3
+    assert shapes[2]['docs_examined'] == 6
+    assert shapes[2]['indexes'] == {'_all_docs': 2}
@@ -0,0 +1,50 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import pytest
+
+from wheelchair.api import Database, MangoQuery
+from wheelchair.api.database.index_advisor import IndexAdvisor
+
+
+def test_suggest():
+    res = IndexAdvisor.suggest({'type': 'doc', 'value': {'$gt': 1}})
+
+    assert res == dict(index=dict(fields=['type', 'value']))
+
+    res = IndexAdvisor.suggest({'type': 'doc', 'value': {'$gt': 1}}, sort=[{'created': 'asc'}])
+
+    assert res == dict(index=dict(fields=['type', 'created']))
+
+    res = IndexAdvisor.suggest({'owner': {'name': 'bob'}, 'status': {'$ne': 'deleted'}})
+
+    assert res == dict(index=dict(fields=['owner.name']), selector={'status': {'$ne': 'deleted'}})
+
+    res = IndexAdvisor.suggest({'$or': [{'a': 1}, {'b': 2}]})
+
+    assert res is None
+
+
+@pytest.mark.asyncio
+async def test_index_advisor(new_database: Database):
+    await new_database.post(dict(type='doc', value=1))
+    await new_database.post(dict(type='doc', value=2))
+    await new_database.post(dict(type='other_doc', value=3))
+
+    res = await new_database.index_advisor([{'type': 'doc'}, MangoQuery({'value': {'$gt': 1}})])
+
+    assert len(res) == 2
+
+    for advice in res:
+        assert advice.full_scan
+        assert advice.execution_stats['results_returned'] > 0
+        assert advice.suggestion is not None
+
+    await new_database.index.post(**res[0].suggestion)
+
+    res = await new_database.index_advisor([{'type': 'doc'}])
+
+    assert not res[0].full_scan
+    assert res[0].suggestion is None
@@ -0,0 +1,80 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+from typing import List, Optional
+
+import pytest
+
+from wheelchair.api import Database, Field, Model, ModelValidationError
+
+
+class Address(Model):
+    city: str
+    zip: Optional[str] = None
+
+
+class User(Model):
+    name: str
+    age: int = Field(0, validator=lambda age: age >= 0)
+    tags: List[str] = Field(default_factory=list)
+    address: Optional[Address] = None
+    kind: str = Field('user', key='type')
+
+
+def test_model():
+    doc = dict(_id='user1', _rev='1-abc', name='John', age=30, tags=['a'], address=dict(city='Paris', zip=None),
+               type='user', extra=True)
+
+    user = User.from_doc(doc)
+
+    assert user.name == 'John'
+    assert user.address.city == 'Paris'
+    assert user.kind == 'user'
+    assert not hasattr(user, '__dict__')
+    assert user.to_doc() == doc
+
+    user = User(name='Jane')
+
+    assert user.to_doc() == dict(name='Jane', age=0, tags=[], address=None, type='user')
+
+
+@pytest.mark.parametrize('doc', [
+    dict(age=30),
+    dict(name=1),
+    dict(name='John', age=True),
+    dict(name='John', age=-1),
+    dict(name='John', tags=[1]),
+    dict(name='John', address=dict(zip='75001')),
+])
+def test_model_validation(doc: dict):
+    with pytest.raises(ModelValidationError):
+        User.from_doc(doc)
+
+
+def test_model_mutable_default():
+    with pytest.raises(ValueError):
+        class Tagged(Model):
+            tags: list = []
+
+    with pytest.raises(ValueError):
+        Field({})
+
+
+@pytest.mark.asyncio
+async def test_model_results(new_database: Database):
+    await new_database.bulk.docs([User(_id=f'user{i}', name=f'user{i}', age=i).to_doc() for i in range(3)])
+
+    res = await new_database.find(dict(age={'$gt': 0}))
+    users = User.from_find(res)
+
+    assert sorted(user.age for user in users) == [1, 2]
+
+    res = await new_database.all_docs(include_docs=True)
+
+    assert [user.name for user in User.from_view(res)] == ['user0', 'user1', 'user2']
+
+    res = await new_database.bulk([dict(id='user0'), dict(id='missing')])
+
+    assert [user.name for user in User.from_bulk(res)] == ['user0']
@@ -0,0 +1,43 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import pytest
+
+from wheelchair import Connection
+from wheelchair.api import NodeStatsCollector
+
+
+@pytest.mark.asyncio
+async def test_stats(admin_connection: Connection):
+    res = await admin_connection.node().stats()
+
+    assert 'couchdb' in res
+
+    res = await admin_connection.node().system()
+
+    assert 'memory' in res
+
+
+@pytest.mark.asyncio
+async def test_stats_collector(admin_connection: Connection):
+    collector = NodeStatsCollector(admin_connection, max_samples=2)
+
+    await collector.collect()
+
+    node = collector.nodes[0]
+
+    assert collector.rate(node, ('couchdb', 'httpd', 'requests')) is None
+
+    await admin_connection.server()
+    await collector.collect()
+    await collector.collect()
+
+    assert len(collector.samples(node)) == 2
+    assert collector.rate(node, ('couchdb', 'httpd', 'requests')) > 0
+
+    summary = collector.summary(node)
+
+    assert summary['requests_per_sec'] > 0
+    assert 'total' in summary['memory']
@@ -0,0 +1,90 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+from secrets import token_hex
+
+import pytest
+
+from wheelchair import Connection
+from wheelchair.api import Database
+from wheelchair.api.database.partition import Partition
+
+PARTITIONS = ['p0', 'p1', 'p2', 'p3']
+
+
+@pytest.fixture
+async def partitioned_database(admin_connection: Connection) -> Database:
+    db = admin_connection.db('test_' + token_hex())
+
+    await admin_connection.query('PUT', [db.name], params=dict(partitioned=True))
+
+    docs = [dict(_id=f'{p}:{token_hex()}', n=i * len(PARTITIONS) + j, name=token_hex(), group=dict(n=i))
+            for j, p in enumerate(PARTITIONS) for i in range(5)]
+    await db.bulk.docs(docs)
+
+    await db.index.post(dict(fields=['n']))
+    await db.index.post(dict(fields=['name']))
+
+    yield db
+
+    await db.delete()
+
+
+@pytest.mark.asyncio
+async def test_partition_find(partitioned_database: Database):
+    res = await partitioned_database.partition.find(PARTITIONS, {'n': {'$gte': 0}}, sort=[{'n': 'desc'}], limit=7,
+                                                    fields=['_id', 'group'], concurrency=2)
+
+    assert [doc['_id'].split(':')[0] for doc in res['docs']] == ['p3', 'p2', 'p1', 'p0', 'p3', 'p2', 'p1']
+    assert set(res['bookmarks']) == set(PARTITIONS)
+
+    # The sort field is requested for the merge only
+    assert all(set(doc) == {'_id', 'group'} for doc in res['docs'])
+
+    with pytest.raises(ValueError):
+        await partitioned_database.partition.find(PARTITIONS, {'name': {'$gt': None}}, sort=['name'])
+
+
+@pytest.mark.asyncio
+async def test_partition_find_limit(partitioned_database: Database, monkeypatch):
+    find = Partition.find
+    running, max_running = 0, 0
+
+    async def counting_find(partition: Partition, *args, **kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+
+        try:
+            await asyncio.sleep(0.05)
+            return await find(partition, *args, **kwargs)
+        finally:
+            running -= 1
+
+    monkeypatch.setattr(Partition, 'find', counting_find)
+
+    res = await partitioned_database.partition.find(PARTITIONS, {}, concurrency=2)
+
+    assert len(res['docs']) == 20
+    assert max_running == 2
+
+    # Without the sort the rest of partitions isn't queried once the limit is collected
+    res = await partitioned_database.partition.find(PARTITIONS, {}, limit=3, concurrency=1)
+
+    assert len(res['docs']) == 3
+    assert list(res['bookmarks']) == ['p0']
+    assert running == 0
+
+
+@pytest.mark.asyncio
+async def test_partition_view(partitioned_database: Database):
+    await partitioned_database.doc.put('_design/numbers', dict(
+        views=dict(by_n=dict(map='function (doc) { emit(doc.n, null); }')),
+    ))
+
+    res = await partitioned_database.partition.view(PARTITIONS, 'numbers', 'by_n', limit=6, concurrency=3)
+
+    assert [row['key'] for row in res['rows']] == [0, 1, 2, 3, 4, 5]
@@ -0,0 +1,60 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+from secrets import token_hex
+
+import pytest
+
+from wheelchair.api import Database, Replicator
+from wheelchair.api.replicator.replicator import _compare_logs
+
+
+def test_compare_logs():
+    source = dict(session_id='b', source_last_seq='10', history=[dict(session_id='b', recorded_seq='10'),
+                                                                 dict(session_id='a', recorded_seq='5')])
+    target = dict(session_id='a', source_last_seq='5', history=[dict(session_id='a', recorded_seq='5')])
+
+    assert _compare_logs(source, source) == '10'
+    assert _compare_logs(source, target) == '5'
+    assert _compare_logs(source, dict(session_id='c', history=[])) == 0
+
+
+@pytest.mark.asyncio
+async def test_replicator(new_database: Database):
+    target = new_database.connection.db('test_' + token_hex())
+    await target.create()
+
+    try:
+        await new_database.bulk.docs([dict(value=i) for i in range(20)])
+
+        res = await new_database.doc.put('with_att', {})
+        await new_database.att.put('with_att', 'my_data', 'application/octet-stream', b'Test data', rev=res['rev'])
+
+        def transform(doc: dict) -> dict:
+            return dict(doc, replicated=True)
+
+        replicator = Replicator(new_database, target, transform=transform, batch_size=5, workers=2)
+        stats = await replicator()
+
+        assert stats.docs_written == 21
+        assert stats.doc_write_failures == 0
+
+        res = await target.all_docs(include_docs=True)
+
+        assert len(res['rows']) == 21
+        assert all(row['doc']['replicated'] for row in res['rows'])
+
+        res = await target.att('with_att', 'my_data')
+
+        assert await res.stream.read() == b'Test data'
+
+        await new_database.post(dict(value=100))
+
+        stats = await Replicator(new_database, target)()
+
+        assert stats.missing_checked == 1
+        assert stats.docs_written == 1
+    finally:
+        await target.delete()
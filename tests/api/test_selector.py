@@ -0,0 +1,84 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import pytest
+
+from wheelchair.api import Selector
+
+DOCS = [
+    dict(_id='a', type='doc', value=1, tags=['x', 'y'], owner=dict(name='alice', age=30)),
+    dict(_id='b', type='doc', value=2, tags=['y'], owner=dict(name='bob', age=25)),
+    dict(_id='c', type='other', value=3, tags=[], points=[dict(v=1), dict(v=5)]),
+    dict(_id='d', type='other', value='3', extra=None),
+]
+
+
+def ids(selector: dict) -> set:
+    return {doc['_id'] for doc in Selector(selector).filter(DOCS)}
+
+
+def test_equality():
+    assert ids({'type': 'doc'}) == {'a', 'b'}
+    assert ids({'type': {'$eq': 'other'}}) == {'c', 'd'}
+    assert ids({'type': {'$ne': 'other'}}) == {'a', 'b'}
+    assert ids({'value': 1.0}) == {'a'}
+
+
+def test_comparison():
+    assert ids({'value': {'$gt': 1}}) == {'b', 'c', 'd'}
+    assert ids({'value': {'$gt': 1, '$lt': 3}}) == {'b'}
+    assert ids({'value': {'$lte': 2}}) == {'a', 'b'}
+    assert ids({'value': {'$gte': 'a'}}) == set()
+
+
+def test_subfields():
+    assert ids({'owner.name': 'alice'}) == {'a'}
+    assert ids({'owner': {'age': {'$lt': 30}}}) == {'b'}
+
+
+def test_combination():
+    assert ids({'$or': [{'value': 1}, {'type': 'other'}]}) == {'a', 'c', 'd'}
+    assert ids({'$and': [{'type': 'doc'}, {'value': {'$gt': 1}}]}) == {'b'}
+    assert ids({'$nor': [{'type': 'doc'}, {'value': 3}]}) == {'d'}
+    assert ids({'value': {'$not': {'$eq': 1}}}) == {'b', 'c', 'd'}
+
+
+def test_arrays():
+    assert ids({'tags': {'$in': ['x']}}) == {'a'}
+    # Elements of arrays are matched, not the arrays themselves
+    assert ids({'tags': {'$in': [['y']]}}) == set()
+    assert ids({'tags': {'$nin': [['y']]}}) == {'a', 'b', 'c'}
+    assert ids({'value': {'$in': [1, 2]}}) == {'a', 'b'}
+    assert ids({'value': {'$nin': [1, 2]}}) == {'c', 'd'}
+    assert ids({'tags': {'$all': ['x', 'y']}}) == {'a'}
+    assert ids({'tags': {'$all': []}}) == set()
+    assert ids({'tags': {'$size': 1}}) == {'b'}
+    assert ids({'tags': {'$elemMatch': {'$eq': 'y'}}}) == {'a', 'b'}
+    assert ids({'points': {'$elemMatch': {'v': {'$gt': 3}}}}) == {'c'}
+    assert ids({'points': {'$allMatch': {'v': {'$gt': 0}}}}) == {'c'}
+    assert ids({'tags': {'$allMatch': {'$eq': 'y'}}}) == {'b'}
+
+
+def test_misc():
+    assert ids({'extra': {'$exists': True}}) == {'d'}
+    assert ids({'extra': {'$exists': False}}) == {'a', 'b', 'c'}
+    assert ids({'extra': {'$ne': 1}}) == {'d'}
+    assert ids({'value': {'$type': 'string'}}) == {'d'}
+    assert ids({'value': {'$mod': [2, 1]}}) == {'a', 'c'}
+    assert ids({'owner.name': {'$regex': '^b'}}) == {'b'}
+    assert ids({'owner.name': {'$beginsWith': 'al'}}) == {'a'}
+    assert ids({'owner': {'$keyMapMatch': {'$eq': 'age'}}}) == {'a', 'b'}
+
+
+def test_filter_key():
+    rows = [dict(id=doc['_id'], doc=doc) for doc in DOCS]
+    res = Selector({'type': 'doc'}).filter(rows, key=lambda row: row['doc'])
+
+    assert [row['id'] for row in res] == ['a', 'b']
+
+
+def test_unknown_operator():
+    with pytest.raises(ValueError):
+        Selector({'value': {'$unknown': 1}})
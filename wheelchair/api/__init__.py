@@ -4,6 +4,10 @@
 
 
 from .connection import Connection
-from .database import Database, ViewQuery
+from .database import Database, ViewQuery, MangoQuery, AttachmentCache, AttachmentTask, MultipartAttachment
 from .exceptions import *
-from .utils import StreamRequest, StreamResponse
+from .model import Field, Model
+from .node import NodeStatsCollector
+from .replicator import Replicator
+from .server import ActiveTasksWatcher, CompactionScheduler
+from .utils import StreamRequest, StreamResponse, Selector
@@ -5,18 +5,23 @@
 
 import json
 import logging
-from typing import Optional, List, Dict, Union
+from typing import Any, Optional, List, Dict, Tuple, Union
 from urllib.parse import urlsplit, urljoin, quote, urlencode
 
 from aiohttp import ClientSession, ClientTimeout
+from yarl import URL
 
 from .auth import Auth, CookieAuth
 from .cluster_setup import ClusterSetup
 from .database import DatabaseProxy
+from .database.doc_cache import DocumentCache
+from .database.find_profiler import FindProfiler
+from .database.shard_router import ShardRouter
 from .exceptions import RequestError, UnauthorizedError
 from .node import NodeProxy
 from .scheduler import Scheduler
 from .server import Server
+from .server.uuid_pool import UUIDPool
 from .session import Session
 from .utils import Query
 from .utils.query import StreamResponse, StreamRequest
@@ -26,6 +31,9 @@ default_logger = logging.getLogger('wheelchair')
 
 class Connection:
     __asyncio_session: Optional[ClientSession] = None
+    __find_profiler: Optional[FindProfiler] = None
+    __uuid_pool: Optional[UUIDPool] = None
+    __shard_router: Optional[ShardRouter] = None
 
     def __init__(self, scheme: str, hostname: str, port: int, auth: Auth, *,
                  logger: Optional[logging.Logger] = None):
@@ -43,6 +51,7 @@ class Connection:
 
         self.__asyncio_session = ClientSession()
         self.__logger = logger or default_logger
+        self.__doc_caches: Dict[str, DocumentCache] = {}
 
     @classmethod
     def from_string(cls, connection_string: str, logger: Optional[logging.Logger] = None) -> 'Connection':
@@ -105,13 +114,20 @@ class Connection:
         return self.__url
 
     async def direct_query(self, query: Query, as_stream: bool = False,
-                           timeout: Optional[int] = None) -> Union[int, str, List, Dict, StreamResponse]:
+                           timeout: Optional[int] = None,
+                           base_url: Optional[str] = None) -> Union[int, str, List, Dict, StreamResponse]:
         method, path, params, data, headers = await self.__auth(self, query)
 
         timeout = ClientTimeout(total=timeout)
 
         headers = headers if headers else {}
 
+        if base_url is not None and base_url != self.__url:
+            # Cookies are bound to the host, but the session is valid on all nodes of the cluster
+            cookies = self.__asyncio_session.cookie_jar.filter_cookies(URL(self.__url))
+            if cookies:
+                headers['Cookie'] = '; '.join(f'{name}={cookie.value}' for name, cookie in cookies.items())
+
         if isinstance(data, StreamRequest):
             headers['Content-Type'] = data.content_type
         elif isinstance(data, dict):
@@ -132,7 +148,7 @@ class Connection:
             if qs:
                 path = f"{path}?{qs}"
 
-        full_url = urljoin(self.__url, path)
+        full_url = urljoin(base_url or self.__url, path)
 
         self.__logger.debug("Querying CouchDB: %s %s", method, full_url)
 
@@ -142,8 +158,13 @@ class Connection:
         else:  # isinstance(data, dict) == True
             req = await self.__asyncio_session.request(method, full_url, json=data, headers=headers, timeout=timeout)
 
-        if as_stream and req.status in (200, 201, 202):
-            return StreamResponse(req.headers['Content-Type'], req.content)
+        if req.status == 304:
+            # Not modified since the ETag sent in If-None-Match, there is no body
+            req.release()
+            return None
+
+        if as_stream and req.status in (200, 201, 202, 206):
+            return StreamResponse(req.headers['Content-Type'], req.content, req.headers, req)
 
         res = await req.json()
 
@@ -152,6 +173,39 @@ class Connection:
 
         return res
 
+    async def conditional_query(self, method: str, path: List[str], etag: Optional[str], *,
+                                params: Optional[dict] = None,
+                                data: Optional[Union[int, str, dict, StreamRequest]] = None,
+                                headers: Optional[dict] = None,
+                                base_url: Optional[str] = None) -> Tuple[Any, Optional[str]]:
+        """
+        Performs request to CouchDB revalidating a previous result by its ETag
+
+        :param method: Request method
+        :param path: Request path
+        :param etag: ETag of the previous result, the request is unconditional if None
+        :param params: Query parameters
+        :param data: Data
+        :param headers: Request headers
+        :param base_url: Send the request to another node of the cluster
+        :return: Result of the request and its ETag, or None and the same ETag if the result isn't modified
+        """
+
+        headers = dict(headers or {})
+        if etag is not None:
+            headers['If-None-Match'] = etag
+
+        res = await self.query(method, path, params=params, data=data, headers=headers, as_stream=True,
+                               base_url=base_url)
+
+        if res is None:
+            return None, etag
+
+        try:
+            return await res.json(), res.etag
+        finally:
+            res.release()
+
     async def query(self, method: str,
                     path: List[str],
                     *,
@@ -159,7 +213,8 @@ class Connection:
                     data: Optional[Union[int, str, dict, StreamRequest]] = None,
                     headers: Optional[dict] = None,
                     as_stream: bool = False,
-                    timeout: Optional[int] = None) -> Union[int, str, List, Dict, StreamResponse]:
+                    timeout: Optional[int] = None,
+                    base_url: Optional[str] = None) -> Union[int, str, List, Dict, StreamResponse]:
         """
         Performs request to CouchDB
 
@@ -170,20 +225,21 @@ class Connection:
         :param headers: Request headers
         :param as_stream: Return StreamResponse instead of processed object
         :param timeout: Set custom timeout for logpool requests
+        :param base_url: Send the request to another node of the cluster
         :return: Result of the request
         """
 
         query = Query(method, path, params, data, headers)
 
         try:
-            return await self.direct_query(query, as_stream, timeout)
+            return await self.direct_query(query, as_stream, timeout, base_url)
         except UnauthorizedError:
             pass
 
         # We are here because an UnauthorizedError occurred
         # Let's try authentication and try again to execute the request
         await self.authenticate()
-        return await self.direct_query(query, as_stream, timeout)
+        return await self.direct_query(query, as_stream, timeout, base_url)
 
     @property
     def server(self) -> Server:
@@ -209,12 +265,113 @@ class Connection:
     def db(self) -> DatabaseProxy:
         return DatabaseProxy(self)
 
+    @property
+    def find_profiler(self) -> Optional[FindProfiler]:
+        return self.__find_profiler
+
+    def enable_find_profiler(self, max_samples: int = 1000, explain: bool = True,
+                             explain_ttl: float = 60.0) -> FindProfiler:
+        """\
+        Starts collecting execution statistics of all find requests made through this connection.
+
+        :param max_samples: Number of latest latencies kept per query shape
+        :param explain: Explain queries of each shape to find out the used index, otherwise indexes aren't reported
+        :param explain_ttl: Seconds the used index of a shape is cached for
+        :return: The profiler
+        """
+
+        self.__find_profiler = FindProfiler(max_samples, explain, explain_ttl)
+        return self.__find_profiler
+
+    def disable_find_profiler(self):
+        self.__find_profiler = None
+
+    @property
+    def uuid_pool(self) -> Optional[UUIDPool]:
+        return self.__uuid_pool
+
+    def enable_uuid_pool(self, batch_size: int = 1000, low_water: int = 100,
+                         fallback: Optional[str] = None, backoff: float = 0.5,
+                         max_backoff: float = 30.0) -> UUIDPool:
+        """\
+        Creates a pool of UUIDs prefetched from the server.
+
+        :param batch_size: Number of UUIDs fetched by a request
+        :param low_water: Number of UUIDs left in the pool the refill starts at
+        :param fallback: Algorithm of the local generator used if the pool is empty: random, sequential, utc_random
+                         or auto to use the algorithm configured on the server
+        :param backoff: Base delay in seconds before a failed refill is retried
+        :param max_backoff: Max delay in seconds before a failed refill is retried
+        :return: The pool
+        """
+
+        self.__uuid_pool = UUIDPool(self, batch_size=batch_size, low_water=low_water, fallback=fallback,
+                                    backoff=backoff, max_backoff=max_backoff)
+        return self.__uuid_pool
+
+    def disable_uuid_pool(self):
+        self.__uuid_pool = None
+
+    @property
+    def shard_router(self) -> Optional[ShardRouter]:
+        return self.__shard_router
+
+    def enable_shard_routing(self, node_urls: Optional[Dict[str, str]] = None, derive_urls: bool = False,
+                             ttl: float = 300.0, down_time: float = 30.0) -> ShardRouter:
+        """\
+        Starts sending single document requests directly to the nodes owning the documents' shards.
+        The session cookie is sent to the nodes too.
+
+        :param node_urls: Base URLs of the nodes by their names, other nodes are reached through the connection
+        :param derive_urls: Derive URLs of the nodes missing in `node_urls` from their names
+        :param ttl: Seconds the shard map of a database is cached for
+        :param down_time: Seconds a node failed to connect is skipped for
+        :return: The router
+        """
+
+        self.__shard_router = ShardRouter(self, node_urls=node_urls, derive_urls=derive_urls, ttl=ttl,
+                                          down_time=down_time)
+        return self.__shard_router
+
+    def disable_shard_routing(self):
+        self.__shard_router = None
+
+    def doc_cache(self, database: str) -> Optional[DocumentCache]:
+        return self.__doc_caches.get(database)
+
+    def enable_doc_cache(self, database: str, max_size: int = 1000, ttl: Optional[float] = 60.0,
+                         refresh: bool = False) -> DocumentCache:
+        """\
+        Starts caching documents of the database read and written through this connection.
+
+        :param database: Name of the database
+        :param max_size: Max number of cached documents
+        :param ttl: Seconds a document is cached for, None to keep it until it changes
+        :param refresh: Fetch changed documents instead of evicting them
+        :return: The cache
+        """
+
+        self.disable_doc_cache(database)
+
+        cache = self.__doc_caches[database] = DocumentCache(self, database, max_size=max_size, ttl=ttl,
+                                                            refresh=refresh)
+        return cache
+
+    def disable_doc_cache(self, database: str):
+        cache = self.__doc_caches.pop(database, None)
+
+        if cache is not None:
+            cache.close()
+
     async def authenticate(self):
         """Performs authentication though given auth."""
 
         return await self.__auth.authenticate(self)
 
     async def shutdown_cleanup(self):
+        for database in list(self.__doc_caches):
+            self.disable_doc_cache(database)
+
         if self.__asyncio_session is None:
             return
 
@@ -2,6 +2,12 @@
 # This file is part of Wheelchair, the async CouchDB connector.
 # Wheelchair is released under the MIT License (see LICENSE).
 
+from .attachment_batch import AttachmentTask
+from .attachment_cache import AttachmentCache
 from .database import Database
 from .database import DatabaseProxy
+from .doc import MultipartAttachment
+from .doc_cache import DocumentCache
+from .index_advisor import MangoQuery
+from .shard_router import ShardRouter
 from .view import ViewQuery
@@ -1,13 +1,23 @@
 # Copyright (C) 2019-2021 by Vd.
 # This file is part of Wheelchair, the async CouchDB connector.
 # Wheelchair is released under the MIT License (see LICENSE).
+import asyncio
+import mimetypes
+import os
+from base64 import b64encode
+from hashlib import md5
 from io import IOBase
-from typing import TYPE_CHECKING, Optional, Generator, AsyncGenerator, Union
+from typing import TYPE_CHECKING, Optional, Generator, AsyncGenerator, Union, BinaryIO, Tuple, Callable, Any, List, Dict
 
+from aiohttp import ClientError
+
+from .attachment_batch import AttachmentBatch
+from ..exceptions import AttachmentIntegrityError, RequestError
 from ..utils.query import StreamResponse, StreamRequest
 
 if TYPE_CHECKING:
     from .database import Database
+    from .view import BaseView
 
 
 class BaseAttachment:
@@ -19,15 +29,152 @@ class BaseAttachment:
     def database(self) -> 'Database':
         return self.__database
 
-    async def __call__(self, _id: str, name: str, *, rev: Optional[str] = None) -> StreamResponse:
+    async def __call__(self, _id: str, name: str, *,
+                       rev: Optional[str] = None,
+                       byte_range: Optional[Tuple[int, Optional[int]]] = None,
+                       if_range: Optional[str] = None) -> StreamResponse:
         """\
         Returns the attachment by the specified _id.
 
+        The byte range is a pair of the first and the last (inclusive, None means the end) byte positions.
+        The server returns the whole attachment if it can't serve the range (e.g. it is stored compressed),
+        or if the attachment's ETag doesn't match `if_range`; the `Content-Range` header of the response
+        tells which case happened.
+
         https://docs.couchdb.org/en/stable/api/document/attachments.html#get--db-docid-attname
+        https://docs.couchdb.org/en/stable/api/document/attachments.html#http-range-requests
         https://docs.aiohttp.org/en/stable/streams.html?highlight=StreamReader#aiohttp.StreamReader
         """
 
-        return await self.__connection.query('GET', self._get_path(_id, name), params=dict(rev=rev), as_stream=True)
+        headers = None
+        if byte_range is not None:
+            start, end = byte_range
+            headers = dict(Range=f"bytes={start}-{'' if end is None else end}")
+
+            if if_range is not None:
+                headers['If-Range'] = if_range
+
+        return await self.__connection.query('GET', self._get_path(_id, name), params=dict(rev=rev), headers=headers,
+                                             as_stream=True)
+
+    async def download(self, _id: str, name: str, file: Union[str, os.PathLike, BinaryIO], *,
+                       rev: Optional[str] = None,
+                       digest: Optional[str] = None,
+                       resume: bool = False,
+                       chunk_size: int = 1 << 20) -> int:
+        """\
+        Downloads the attachment into the file given by a path or a binary file object.
+
+        The file is preallocated by Content-Length and the content is written by large chunks.
+        The md5 digest of the content is checked against Content-MD5 header or the given digest
+        from the document's attachment stub (`md5-...`). The digest isn't checked if the server sends
+        the attachment compressed (e.g. `text/*` types), it describes the compressed content then.
+        The connection is always released.
+
+        If the download fails, the file given by a path is truncated to the written content.
+        With `resume` set, the download of an existing file continues from its end by a range request.
+        The range is conditional on the ETag of the given digest, and the joined content is checked against
+        the digest or the ETag of the response. If the attachment has changed since the partial download,
+        or the joined content can't be checked, the attachment is downloaded from the start.
+
+        Returns the size of the downloaded content.
+
+        https://docs.couchdb.org/en/stable/api/document/attachments.html#get--db-docid-attname
+        """
+
+        is_path = isinstance(file, (str, os.PathLike))
+        offset = os.path.getsize(file) if resume and is_path and os.path.exists(file) else 0
+        etag = f'"{digest[4:]}"' if digest and digest.startswith('md5-') else None
+
+        while True:
+            try:
+                res = await self(_id, name, rev=rev, byte_range=(offset, None) if offset else None,
+                                 if_range=etag if offset else None)
+            except RequestError as e:
+                if e.code != 416 or not offset:
+                    raise
+
+                # The file is already complete, unless the attachment has got shorter
+                if self._is_complete(file, offset, digest):
+                    return offset
+
+                offset = 0
+                continue
+
+            try:
+                offset, expected = _resumed_digest(res, offset, digest)
+
+                if offset is None:
+                    # The joined content can't be checked
+                    offset = 0
+                    continue
+
+                if not is_path:
+                    return await self._write_response(res, file, md5(), expected, chunk_size)
+
+                size = await self._write_file(res, file, offset, expected, chunk_size)
+            finally:
+                res.release()
+
+            if size is not None:
+                return size
+
+            # The partial file doesn't belong to the attachment, e.g. it has changed since
+            offset = 0
+
+    def _is_complete(self, path: Union[str, os.PathLike], size: int, digest: Optional[str]) -> bool:
+        if digest is None:
+            return False
+
+        try:
+            with open(path, 'rb') as f:
+                self._verify(_hash_file(f, md5(), size), digest)
+        except AttachmentIntegrityError:
+            return False
+
+        return True
+
+    async def _write_file(self, res: StreamResponse, path: Union[str, os.PathLike], offset: int,
+                          digest: Optional[str], chunk_size: int) -> Optional[int]:
+        # Returns None if the content joined to the first `offset` bytes of the file doesn't match the digest
+        with open(path, 'r+b' if offset else 'wb', buffering=0) as f:
+            hasher = _hash_file(f, md5(), offset)
+
+            try:
+                return offset + await self._write_response(res, f, hasher, digest, chunk_size)
+            except AttachmentIntegrityError:
+                if not offset:
+                    raise
+                return None
+            finally:
+                f.truncate(f.tell())
+
+    async def download_parallel(self, _id: str, name: str, path: Union[str, os.PathLike], *,
+                                rev: Optional[str] = None,
+                                digest: Optional[str] = None,
+                                part_size: int = 8 << 20,
+                                concurrency: int = 4,
+                                chunk_size: int = 1 << 20) -> int:
+        """\
+        Downloads the attachment into the file by several concurrent range requests of `part_size` bytes.
+        Parts are written by positional writes into the preallocated file. If the server doesn't serve ranges,
+        the attachment is downloaded by a single request.
+
+        An empty attachment gives an empty file. The file is removed if the download fails.
+        Returns the size of the attachment.
+
+        https://docs.couchdb.org/en/stable/api/document/attachments.html#http-range-requests
+        """
+
+        assert part_size > 0, "Part size should be positive"
+        assert concurrency > 0, "Concurrency should be positive"
+
+        try:
+            with open(path, 'w+b', buffering=0) as f:
+                return await self._download_parts(_id, name, f, rev, digest, part_size, concurrency, chunk_size)
+        except BaseException:
+            os.remove(path)
+            raise
 
     async def put(self, _id: str, name: str, content_type: str,
                   stream: Union[Generator, AsyncGenerator, bytes, bytearray, IOBase], *,
@@ -42,6 +189,41 @@ class BaseAttachment:
         stream_req = StreamRequest(content_type, stream)
         return await self.__connection.query('PUT', self._get_path(_id, name), params=dict(rev=rev), data=stream_req)
 
+    async def upload(self, _id: str, name: str, path: Union[str, os.PathLike], *,
+                     content_type: Optional[str] = None,
+                     rev: Optional[str] = None,
+                     progress: Optional[Callable[[int, int], Any]] = None,
+                     retries: int = 0,
+                     chunk_size: int = 1 << 20) -> dict:
+        """\
+        Uploads the file into the document streaming it from the disk by chunks.
+
+        The content type is guessed by the file name if not given. The progress callback is called
+        with the number of sent bytes and the file size after every chunk. The file is reopened for every
+        attempt, so the upload is retried up to `retries` times on connection errors.
+
+        Returns the server response with the `digest` (`md5-...`) of the uploaded content added.
+
+        https://docs.couchdb.org/en/stable/api/document/attachments.html#put--db-docid-attname
+        """
+
+        if content_type is None:
+            content_type = mimetypes.guess_type(str(path))[0] or 'application/octet-stream'
+
+        stream = _FileStream(path, progress, chunk_size)
+        headers = {'Content-Length': str(stream.size)}
+
+        for attempt in range(retries + 1):
+            try:
+                res = await self.__connection.query('PUT', self._get_path(_id, name), params=dict(rev=rev),
+                                                    data=StreamRequest(content_type, stream), headers=headers)
+            except (ClientError, asyncio.TimeoutError):
+                if attempt == retries:
+                    raise
+                continue
+
+            return dict(res, digest='md5-' + b64encode(stream.hasher.digest()).decode())
+
     async def delete(self, _id: str, name: str, rev: str, batch: Optional[bool] = None) -> dict:
         """\
         Deletes the attachment specified by name from the document _id.
@@ -53,20 +235,373 @@ class BaseAttachment:
 
         return await self.__connection.query('DELETE', self._get_path(_id, name), params=params)
 
+    async def copy_to(self, _id: str, name: str, target: 'BaseAttachment', *,
+                      dst_id: Optional[str] = None,
+                      dst_name: Optional[str] = None,
+                      rev: Optional[str] = None,
+                      dst_rev: Optional[str] = None,
+                      chunk_size: int = 1 << 16,
+                      buffer_chunks: int = 16) -> dict:
+        """\
+        Copies the attachment into a document of the target scope, which may belong to another database or
+        connection. The content is piped from the download into the upload through a queue of at most
+        `buffer_chunks` chunks, so the memory usage doesn't depend on the attachment size.
+
+        If the upload is sent again, e.g. after the target connection has authenticated, the attachment
+        is downloaded again; the copy fails if it has been changed since.
+
+        Returns the response of the upload.
+
+        https://docs.couchdb.org/en/stable/api/document/attachments.html#get--db-docid-attname
+        https://docs.couchdb.org/en/stable/api/document/attachments.html#put--db-docid-attname
+        """
+
+        stream = _CopyStream(self, _id, name, rev, await self(_id, name, rev=rev), chunk_size, buffer_chunks)
+
+        try:
+            res = stream.response
+            headers = {}
+            if res.headers is not None and 'Content-Encoding' not in res.headers and 'Content-Length' in res.headers:
+                headers['Content-Length'] = res.headers['Content-Length']
+
+            path = target._get_path(dst_id or _id, dst_name or name)
+            data = StreamRequest(res.content_type, stream)
+            return await target.__connection.query('PUT', path, params=dict(rev=dst_rev), data=data, headers=headers)
+        finally:
+            stream.response.release()
+
+    def batch(self, concurrency: int = 8) -> 'AttachmentBatch':
+        """\
+        Returns scope for concurrent uploads and downloads of many attachments.
+        """
+
+        return AttachmentBatch(self, concurrency)
+
+    async def _current_revs(self, ids: List[str]) -> Dict[str, str]:
+        """Returns current revisions of the existing documents among the given ones."""
+
+        keys = [self._get_doc_key(_id) for _id in ids]
+        res = await self._get_docs_view()(keys=keys)
+
+        revs = {}
+        for _id, row in zip(ids, res['rows']):
+            value = row.get('value')
+            if value and not value.get('deleted'):
+                revs[_id] = value['rev']
+
+        return revs
+
     def _get_path(self, _id: str, name: str):
         raise NotImplementedError
 
+    def _get_doc_key(self, _id: str) -> str:
+        raise NotImplementedError
+
+    def _get_docs_view(self) -> 'BaseView':
+        raise NotImplementedError
+
+    async def _download_parts(self, _id: str, name: str, f: BinaryIO, rev: Optional[str], digest: Optional[str],
+                              part_size: int, concurrency: int, chunk_size: int) -> int:
+        try:
+            first = await self(_id, name, rev=rev, byte_range=(0, part_size - 1))
+        except RequestError as e:
+            if e.code != 416:
+                raise
+
+            # The attachment is empty, there are no bytes to request
+            self._verify(md5(), digest)
+            return 0
+
+        if first.headers is None or 'Content-Range' not in first.headers:
+            try:
+                return await self._write_response(first, f, md5(), digest, chunk_size)
+            finally:
+                first.release()
+
+        size = int(first.headers['Content-Range'].rsplit('/', 1)[1])
+        etag = first.headers.get('ETag')
+        fd = f.fileno()
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def part(start: int, end: int):
+            async with semaphore:
+                res = await self(_id, name, rev=rev, byte_range=(start, end))
+                await self._write_part(res, fd, start, end, etag, chunk_size)
+
+        tasks = [asyncio.ensure_future(self._write_part(first, fd, 0, min(part_size, size) - 1, etag, chunk_size))]
+        tasks += [asyncio.ensure_future(part(start, min(start + part_size, size) - 1))
+                  for start in range(part_size, size, part_size)]
+
+        try:
+            _preallocate(f, size)
+            await asyncio.gather(*tasks)
+        finally:
+            for task in tasks:
+                task.cancel()
+            first.release()
+
+        if digest is not None:
+            f.seek(0)
+            self._verify(_hash_file(f, md5(), size), digest)
+
+        return size
+
+    @staticmethod
+    async def _write_part(res: StreamResponse, fd: int, start: int, end: int, etag: Optional[str], chunk_size: int):
+        try:
+            if res.headers.get('ETag') != etag:
+                raise AttachmentIntegrityError("Attachment has been changed during the download")
+
+            offset = start
+            async for chunk in res.stream.iter_chunked(chunk_size):
+                _pwrite(fd, chunk, offset)
+                offset += len(chunk)
+
+            if offset != end + 1:
+                raise AttachmentIntegrityError(f"Attachment part is incomplete: got {offset - start} "
+                                               f"of {end + 1 - start} bytes")
+        finally:
+            res.release()
+
+    @staticmethod
+    def _verify(hasher, digest: Optional[str]):
+        if digest is not None and digest.startswith('md5-') and b64encode(hasher.digest()).decode() != digest[4:]:
+            raise AttachmentIntegrityError("Attachment digest mismatch")
+
+    @staticmethod
+    async def _write_response(res: StreamResponse, f: BinaryIO, hasher,
+                              digest: Optional[str], chunk_size: int) -> int:
+        # Content-Length, Content-MD5 and the digest describe the encoded content if the server compressed it,
+        # while the content is decoded on read; Content-MD5 of a partial response is not the digest
+        # of the whole attachment.
+        headers = res.headers or {}
+        encoded = 'Content-Encoding' in headers
+        length = None if encoded else headers.get('Content-Length')
+        expected = None
+
+        if not encoded:
+            expected = digest[4:] if digest and digest.startswith('md5-') else None
+
+            if expected is None and 'Content-Range' not in headers:
+                expected = headers.get('Content-MD5')
+
+        if length is not None:
+            _preallocate(f, int(length))
+
+        written = 0
+
+        async for chunk in res.stream.iter_chunked(chunk_size):
+            view = memoryview(chunk)
+            while view:
+                n = f.write(view)
+                view = view[len(view) if n is None else n:]
+
+            hasher.update(chunk)
+            written += len(chunk)
+
+        if length is not None and written != int(length):
+            raise AttachmentIntegrityError(f"Attachment is incomplete: got {written} of {length} bytes")
+
+        if expected is not None and b64encode(hasher.digest()).decode() != expected:
+            raise AttachmentIntegrityError("Attachment digest mismatch")
+
+        return written
+
 
 class Attachment(BaseAttachment):
     def _get_path(self, _id: str, name: str):
         return [self.database.name, _id, name]
 
+    def _get_doc_key(self, _id: str) -> str:
+        return _id
+
+    def _get_docs_view(self) -> 'BaseView':
+        return self.database.all_docs
+
 
 class DesignAttachment(BaseAttachment):
     def _get_path(self, _id: str, name: str):
         return [self.database.name, '_design', _id, name]
 
+    def _get_doc_key(self, _id: str) -> str:
+        return '_design/' + _id
+
+    def _get_docs_view(self) -> 'BaseView':
+        return self.database.all_docs
+
 
 class LocalAttachment(BaseAttachment):
     def _get_path(self, _id: str, name: str):
         return [self.database.name, '_local', _id, name]
+
+    def _get_doc_key(self, _id: str) -> str:
+        return '_local/' + _id
+
+    def _get_docs_view(self) -> 'BaseView':
+        return self.database.local_docs
+
+
+class _FileStream:
+    """\
+    Re-iterable stream of the file content: every iteration reopens the file,
+    so the request can be sent again after a failure or authentication.
+    """
+
+    def __init__(self, path: Union[str, os.PathLike], progress: Optional[Callable[[int, int], Any]], chunk_size: int):
+        self.path = path
+        self.size = os.path.getsize(path)
+        self.hasher = md5()
+        self.__progress = progress
+        self.__chunk_size = chunk_size
+
+    async def __aiter__(self) -> AsyncGenerator[bytes, None]:
+        self.hasher = md5()
+        sent = 0
+
+        with open(self.path, 'rb') as f:
+            while True:
+                chunk = f.read(self.__chunk_size)
+                if not chunk:
+                    break
+
+                self.hasher.update(chunk)
+                sent += len(chunk)
+
+                yield chunk
+
+                if self.__progress is not None:
+                    self.__progress(sent, self.size)
+
+
+class _CopyStream:
+    """\
+    Re-iterable content of the source attachment: the first iteration reads the given response,
+    every next one downloads the attachment again, so the upload can be sent again after authentication.
+    """
+
+    def __init__(self, source: BaseAttachment, _id: str, name: str, rev: Optional[str], response: StreamResponse,
+                 chunk_size: int, buffer_chunks: int):
+        self.response = response
+        self.__source = source
+        self.__id = _id
+        self.__name = name
+        self.__rev = rev
+        self.__etag = response.etag
+        self.__chunk_size = chunk_size
+        self.__buffer_chunks = buffer_chunks
+        self.__read = False
+
+    async def __aiter__(self) -> AsyncGenerator[bytes, None]:
+        res = await self._open()
+        queue = asyncio.Queue(maxsize=self.__buffer_chunks)
+        reader = asyncio.ensure_future(self._read(res, queue))
+
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is None:
+                    return
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            reader.cancel()
+
+    async def _open(self) -> StreamResponse:
+        if self.__read:
+            self.response.release()
+            self.response = await self.__source(self.__id, self.__name, rev=self.__rev)
+
+            if self.response.etag != self.__etag:
+                raise AttachmentIntegrityError("Attachment has been changed during the copy")
+
+        self.__read = True
+        return self.response
+
+    async def _read(self, res: StreamResponse, queue: asyncio.Queue):
+        try:
+            async for chunk in res.stream.iter_chunked(self.__chunk_size):
+                await queue.put(chunk)
+        except Exception as e:
+            await queue.put(e)
+            return
+
+        await queue.put(None)
+
+
+def _hash_file(f: BinaryIO, hasher, size: int, chunk_size: int = 1 << 20):
+    """Feeds the hasher with the first size bytes of the file and leaves the file positioned after them."""
+
+    f.seek(0)
+
+    while size > 0:
+        chunk = f.read(min(chunk_size, size))
+        if not chunk:
+            break
+
+        hasher.update(chunk)
+        size -= len(chunk)
+
+    return hasher
+
+
+def _pwrite(fd: int, data: bytes, offset: int):
+    view = memoryview(data)
+
+    while view:
+        if hasattr(os, 'pwrite'):
+            n = os.pwrite(fd, view, offset)
+        else:
+            # There is no await between seek and write, so concurrent parts can't interleave here
+            os.lseek(fd, offset, os.SEEK_SET)
+            n = os.write(fd, view)
+
+        view = view[n:]
+        offset += n
+
+
+def _resumed_digest(res: StreamResponse, offset: int, digest: Optional[str]) -> Tuple[Optional[int], Optional[str]]:
+    """Finds the offset the response content starts at and its digest, the offset is None if it can't be checked."""
+
+    if not offset:
+        return 0, digest
+
+    headers = res.headers or {}
+
+    if 'Content-Range' not in headers:
+        # The whole attachment is returned
+        return 0, digest
+
+    expected = digest or _etag_digest(headers.get('ETag'))
+    return (offset, expected) if expected is not None else (None, None)
+
+
+def _etag_digest(etag: Optional[str]) -> Optional[str]:
+    # ETag of an attachment is the base64 encoded md5 of its content
+    if etag is None:
+        return None
+
+    etag = etag.strip('"')
+    return 'md5-' + etag if len(etag) == 24 and etag.endswith('==') else None
+
+
+def _preallocate(f: BinaryIO, length: int):
+    """Reserves disk space for the length bytes from the current position of the file."""
+
+    try:
+        fd, offset = f.fileno(), f.tell()
+    except (AttributeError, OSError):
+        return
+
+    if length <= 0:
+        return
+
+    if hasattr(os, 'posix_fallocate'):
+        try:
+            os.posix_fallocate(fd, offset, length)
+            return
+        except OSError:
+            pass
+
+    if os.fstat(fd).st_size < offset + length:
+        os.ftruncate(fd, offset + length)
@@ -0,0 +1,121 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import os
+import time
+from collections import OrderedDict
+from typing import Iterable, List, NamedTuple, Optional, Tuple, Union
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .attachment import BaseAttachment
+
+
+class AttachmentTask(NamedTuple):
+    doc_id: str
+    name: str
+    path: Union[str, os.PathLike]
+    content_type: Optional[str] = None
+
+
+class AttachmentBatchReport(NamedTuple):
+    succeeded: List[AttachmentTask]
+    failed: List[Tuple[AttachmentTask, BaseException]]
+    transferred: int
+    elapsed: float
+
+    @property
+    def throughput(self) -> float:
+        """Transferred bytes per second."""
+
+        return self.transferred / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class AttachmentBatch:
+    """\
+    Uploads and downloads many attachments with a limited number of concurrent requests.
+
+    Failures don't stop the batch, they are collected into the report.
+    """
+
+    def __init__(self, attachment: 'BaseAttachment', concurrency: int = 8):
+        assert concurrency > 0, "Concurrency should be positive"
+
+        self.__attachment = attachment
+        self.__concurrency = concurrency
+
+    @property
+    def attachment(self) -> 'BaseAttachment':
+        return self.__attachment
+
+    async def upload(self, tasks: Iterable[AttachmentTask], *, retries: int = 0) -> AttachmentBatchReport:
+        """\
+        Uploads files into the documents' attachments.
+
+        Attachments of the same document are uploaded one after another, each one with the revision
+        returned by the previous upload; current revisions of the existing documents are fetched by a single
+        request. Missing documents are created.
+        """
+
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.__concurrency)
+        succeeded, failed, transferred = [], [], 0
+
+        docs = OrderedDict()
+        for task in tasks:
+            docs.setdefault(task.doc_id, []).append(task)
+
+        try:
+            revs = await self.__attachment._current_revs(list(docs)) if docs else {}
+        except Exception as e:
+            # Revisions are unknown, so none of the attachments can be uploaded
+            failed = [(task, e) for doc_tasks in docs.values() for task in doc_tasks]
+            return AttachmentBatchReport(succeeded, failed, transferred, time.monotonic() - started)
+
+        async def chain(doc_id: str, doc_tasks: List[AttachmentTask]):
+            nonlocal transferred
+            rev = revs.get(doc_id)
+
+            for task in doc_tasks:
+                try:
+                    async with semaphore:
+                        res = await self.__attachment.upload(doc_id, task.name, task.path,
+                                                             content_type=task.content_type, rev=rev,
+                                                             retries=retries)
+                except Exception as e:
+                    failed.append((task, e))
+                    continue
+
+                rev = res['rev']
+                transferred += os.path.getsize(task.path)
+                succeeded.append(task)
+
+        await asyncio.gather(*(chain(doc_id, doc_tasks) for doc_id, doc_tasks in docs.items()))
+
+        return AttachmentBatchReport(succeeded, failed, transferred, time.monotonic() - started)
+
+    async def download(self, tasks: Iterable[AttachmentTask]) -> AttachmentBatchReport:
+        """Downloads the attachments into files."""
+
+        started = time.monotonic()
+        semaphore = asyncio.Semaphore(self.__concurrency)
+        succeeded, failed, transferred = [], [], 0
+
+        async def download(task: AttachmentTask):
+            nonlocal transferred
+
+            try:
+                async with semaphore:
+                    transferred += await self.__attachment.download(task.doc_id, task.name, task.path)
+            except Exception as e:
+                failed.append((task, e))
+                return
+
+            succeeded.append(task)
+
+        await asyncio.gather(*(download(task) for task in tasks))
+
+        return AttachmentBatchReport(succeeded, failed, transferred, time.monotonic() - started)
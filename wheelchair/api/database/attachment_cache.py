@@ -0,0 +1,154 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import os
+import time
+from secrets import token_hex
+from typing import Dict, Optional, Union
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .attachment import BaseAttachment
+
+
+class AttachmentCache:
+    """\
+    On-disk cache of attachments keyed by their digest from the document's attachment stub.
+
+    Attachments are downloaded into a temporary file and atomically renamed into the cache, so readers never
+    see partial content. Concurrent requests for the same digest are served by a single download, both within
+    the process and between processes sharing the directory. The least recently used files are evicted when
+    the cache grows over `max_size` bytes.
+    """
+
+    def __init__(self, directory: Union[str, os.PathLike], max_size: int, *,
+                 lock_timeout: float = 600.0,
+                 poll_interval: float = 0.1):
+        self.__directory = os.fspath(directory)
+        self.__max_size = max_size
+        self.__lock_timeout = lock_timeout
+        self.__poll_interval = poll_interval
+        self.__fills: Dict[str, asyncio.Future] = {}
+
+        os.makedirs(self.__directory, exist_ok=True)
+
+    @property
+    def directory(self) -> str:
+        return self.__directory
+
+    def path(self, digest: str) -> str:
+        """Returns path of the cached file for the digest."""
+
+        return os.path.join(self.__directory, digest.replace('/', '_').replace('+', '-'))
+
+    def get(self, digest: str) -> Optional[str]:
+        """Returns path of the cached file or None if the digest is not cached."""
+
+        path = self.path(digest)
+
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+
+        return path
+
+    async def fetch(self, attachment: 'BaseAttachment', _id: str, name: str, digest: str, *,
+                    rev: Optional[str] = None) -> str:
+        """\
+        Returns path of the cached attachment, downloading it if it is not cached yet.
+
+        The digest is the `digest` field of the attachment stub of the document, e.g. `md5-...`.
+        The downloaded content is checked against it unless the server sends the attachment compressed,
+        the digest is the one of the compressed content then.
+        """
+
+        path = self.get(digest)
+        if path is not None:
+            return path
+
+        fill = self.__fills.get(digest)
+
+        if fill is None:
+            fill = self.__fills[digest] = asyncio.ensure_future(self._fill(attachment, _id, name, digest, rev))
+            fill.add_done_callback(lambda _: self.__fills.pop(digest, None))
+
+        # Shield the fill, so a cancelled waiter doesn't cancel the download for the others
+        return await asyncio.shield(fill)
+
+    def evict(self, keep: Optional[str] = None):
+        """Removes the least recently used files, except the kept one, until the cache fits the max size."""
+
+        entries, total = [], 0
+
+        for entry in os.scandir(self.__directory):
+            if entry.name.startswith('.') or not entry.is_file():
+                continue
+
+            stat = entry.stat()
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total += stat.st_size
+
+        entries.sort()
+
+        for _, size, path in entries:
+            if total <= self.__max_size:
+                break
+
+            if path == keep:
+                continue
+
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+            total -= size
+
+    async def _fill(self, attachment: 'BaseAttachment', _id: str, name: str, digest: str, rev: Optional[str]) -> str:
+        path = self.path(digest)
+        lock = os.path.join(self.__directory, '.lock-' + os.path.basename(path))
+
+        while not self._acquire(lock):
+            await asyncio.sleep(self.__poll_interval)
+
+            if os.path.exists(path):
+                return path
+
+        try:
+            if os.path.exists(path):
+                return path
+
+            tmp = os.path.join(self.__directory, '.tmp-' + token_hex(8))
+
+            try:
+                await attachment.download(_id, name, tmp, rev=rev, digest=digest)
+                os.replace(tmp, path)
+            except BaseException:
+                if os.path.exists(tmp):
+                    os.remove(tmp)
+                raise
+        finally:
+            os.remove(lock)
+
+        self.evict(keep=path)
+        return path
+
+    def _acquire(self, lock: str) -> bool:
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+            return True
+        except FileExistsError:
+            pass
+
+        # The process holding a stale lock has probably died
+        try:
+            if time.time() - os.path.getmtime(lock) > self.__lock_timeout:
+                os.remove(lock)
+        except FileNotFoundError:
+            pass
+
+        return False
@@ -3,11 +3,15 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
-from typing import Optional, List
+import asyncio
+from typing import Dict, Iterable, Optional, List
 from typing import TYPE_CHECKING
 
+from ..utils import backoff_delay, is_unchanged
+
 if TYPE_CHECKING:
     from .database import Database
+    from .doc import Mutation
 
 
 class Bulk:
@@ -19,25 +23,152 @@ class Bulk:
     def database(self) -> 'Database':
         return self.__database
 
-    async def __call__(self, docs: List[dict], revs: Optional[bool] = None) -> List[dict]:
+    async def __call__(self, docs: List[dict], revs: Optional[bool] = None,
+                       attachments: Optional[bool] = None) -> List[dict]:
         """\
         Performs bulk get query.
 
         https://docs.couchdb.org/en/stable/api/database/bulk-api.html#post--db-_bulk_get
         """
 
-        params = dict(revs=revs)
+        params = dict(revs=revs, attachments=attachments)
         data = dict(docs=docs)
         res = await self.__connection.query('POST', [self.__database.name, '_bulk_get'], params=params, data=data)
         return res['results']
 
-    async def docs(self, docs: List[dict], new_edits: Optional[bool] = None) -> List[dict]:
+    async def docs(self, docs: List[dict], new_edits: Optional[bool] = None,
+                   skip_unchanged: bool = False) -> List[dict]:
         """
         Performs bulk insert/update/delete query.
 
+        If `skip_unchanged` is set, documents with ids are compared with the stored ones and aren't written
+        if their content is the same. Stored documents are taken from the document cache only if they have
+        the same `_rev` as the given ones, others are fetched by a single `_bulk_get`.
+        Results of the skipped writes have the current revision and `skipped` set.
+
         https://docs.couchdb.org/en/stable/api/database/bulk-api.html#post--db-_bulk_docs
         """
 
         params = dict(new_edits=new_edits)
-        data = dict(docs=docs)
-        return await self.__connection.query('POST', [self.__database.name, '_bulk_docs'], params=params, data=data)
+
+        if not skip_unchanged or new_edits is False:
+            return await self._write(docs, params)
+
+        current = await self._current_docs([doc for doc in docs if doc.get('_id')])
+
+        results: List[Optional[dict]] = [None] * len(docs)
+        changed = []
+
+        for i, doc in enumerate(docs):
+            stored = current.get(doc.get('_id'))
+
+            if stored is not None and doc.get('_rev', stored['_rev']) == stored['_rev'] and is_unchanged(doc, stored):
+                results[i] = dict(ok=True, id=stored['_id'], rev=stored['_rev'], skipped=True)
+            else:
+                changed.append(i)
+
+        if changed:
+            res = await self._write([docs[i] for i in changed], params)
+
+            for i, row in zip(changed, res):
+                results[i] = row
+
+        return results
+
+    async def _write(self, docs: List[dict], params: dict) -> List[dict]:
+        res = await self.__connection.query('POST', [self.__database.name, '_bulk_docs'],
+                                            params=params, data=dict(docs=docs))
+
+        cache = self.__connection.doc_cache(self.__database.name)
+
+        if cache is not None:
+            # Read your writes: cached documents are outdated now, not only when the changes feed catches up
+            for doc in docs:
+                if doc.get('_id'):
+                    cache.invalidate(doc['_id'])
+
+        return res
+
+    async def _current_docs(self, docs: List[dict]) -> Dict[str, dict]:
+        current = {}
+        cache = self.__connection.doc_cache(self.__database.name)
+
+        if cache is not None:
+            # A cached document may be outdated, so it is trusted only if the caller has seen the same revision
+            for doc in docs:
+                cached = cache.get(doc['_id']) if doc.get('_rev') else None
+                if cached is not None and cached['_rev'] == doc['_rev']:
+                    current[doc['_id']] = cached
+
+        missing = [dict(id=_id) for _id in dict.fromkeys(doc['_id'] for doc in docs) if _id not in current]
+
+        if missing:
+            for row in await self(missing):
+                item = row['docs'][0]
+                if 'ok' in item:
+                    current[row['id']] = item['ok']
+
+        return current
+
+    async def update(self, ids: Iterable[str], mutate: 'Mutation', *,
+                     create: bool = False,
+                     retries: int = 5,
+                     backoff: float = 0.05,
+                     max_backoff: float = 2.0) -> Dict[str, dict]:
+        """\
+        Atomically updates many documents: fetches them by a single `_bulk_get`, applies the mutation to each one
+        and writes them by a single `_bulk_docs`. Conflicted documents are fetched and mutated again after
+        a jittered exponential backoff, until the retries are exhausted.
+
+        The mutation works the same way as in `Document.update`. Returns results of `_bulk_docs` by the document id,
+        including errors; documents left unchanged are omitted.
+        """
+
+        results = {}
+        pending = list(dict.fromkeys(ids))
+
+        for attempt in range(retries + 1):
+            if not pending:
+                break
+
+            docs = []
+
+            for row in await self([dict(id=_id) for _id in pending]):
+                _id, item = row['id'], row['docs'][0]
+
+                if 'ok' in item:
+                    doc = item['ok']
+                elif create and item['error'].get('error') == 'not_found':
+                    doc = dict(_id=_id)
+                else:
+                    results[_id] = dict(item['error'], id=_id)
+                    continue
+
+                new = mutate(doc)
+                if asyncio.iscoroutine(new):
+                    new = await new
+
+                if new is None:
+                    continue
+
+                new = dict(new, _id=_id)
+                if '_rev' in doc:
+                    new['_rev'] = doc['_rev']
+
+                docs.append(new)
+
+            if not docs:
+                break
+
+            pending = []
+
+            for row in await self.docs(docs):
+                if row.get('error') == 'conflict' and attempt < retries:
+                    pending.append(row['id'])
+                else:
+                    results[row['id']] = row
+
+            if pending:
+                await asyncio.sleep(backoff_delay(attempt, backoff, max_backoff))
+
+        return results
@@ -12,6 +12,8 @@ from .changes import Changes
 from .design import DesignProxy
 from .doc import Document, LocalDocument, DesignDocument
 from .index import Index
+from .index_advisor import IndexAdvisor
+from .partition import PartitionProxy
 from .purged_infos_limit import PurgedInfosLimit
 from .revs_limit import RevsLimit
 from .security import Security
@@ -172,12 +174,29 @@ class Database:
             conflicts=conflicts,
         )
 
-        return await self.__connection.query('POST', [self.__name, '_find'], data=data)
+        profiler = self.__connection.find_profiler
+
+        if profiler is None:
+            return await self.__connection.query('POST', [self.__name, '_find'], data=data)
+
+        return await profiler.profile(
+            self.__name, False, data,
+            lambda d: self.__connection.query('POST', [self.__name, '_find'], data=d),
+            lambda d: self.__connection.query('POST', [self.__name, '_explain'], data=d),
+        )
 
     @property
     def index(self) -> Index:
         return Index(self)
 
+    @property
+    def index_advisor(self) -> IndexAdvisor:
+        """\
+        Returns advisor which looks for find queries not covered by mango indexes.
+        """
+
+        return IndexAdvisor(self)
+
     async def explain(self,
                       selector: dict,
                       limit: Optional[int] = None,
@@ -214,6 +233,16 @@ class Database:
 
         return await self.__connection.query('POST', [self.__name, '_explain'], data=data)
 
+    @property
+    def partition(self) -> PartitionProxy:
+        """\
+        Returns Partition scope of the partitioned database.
+
+        https://docs.couchdb.org/en/stable/api/partitioned-dbs.html
+        """
+
+        return PartitionProxy(self)
+
     @property
     def shards(self) -> Shards:
         return Shards(self)
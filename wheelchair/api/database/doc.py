@@ -3,11 +3,39 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
-from typing import Optional, List
+import asyncio
+import json
+import os
+from secrets import token_hex
+from tempfile import SpooledTemporaryFile
+from typing import Any, Optional, List, Dict, Tuple, Union, AsyncIterable, AsyncGenerator, NamedTuple
+from typing import Awaitable, Callable
 from typing import TYPE_CHECKING
 
+from aiohttp import ClientConnectorError
+
+from ..exceptions import DocumentUpdateConflict, NotFoundError
+from ..utils import backoff_delay, is_unchanged
+from ..utils.query import StreamRequest
+
 if TYPE_CHECKING:
     from .database import Database
+    from .doc_cache import DocumentCache
+    from .shard_router import ShardRouter
+
+
+Mutation = Callable[[dict], Union[Optional[dict], Awaitable[Optional[dict]]]]
+
+
+class MultipartAttachment(NamedTuple):
+    """\
+    Attachment sent along with the document. The data is bytes, a path to a file or an async iterable of bytes;
+    the length is required for the async iterable only.
+    """
+
+    content_type: str
+    data: Union[bytes, bytearray, str, os.PathLike, AsyncIterable[bytes]]
+    length: Optional[int] = None
 
 
 class BaseDocument:
@@ -51,25 +79,168 @@ class BaseDocument:
             revs_info=revs_info,
         )
 
-        return await self.__connection.query('GET', self._get_path(_id), params=params)
+        cache = self._get_cache() if all(v is None for v in params.values()) else None
+
+        if cache is not None and await cache.ready():
+            key = self._get_key(_id)
+            doc, fresh = cache.lookup(key)
+
+            if doc is not None and fresh:
+                return doc
+
+            with cache.pending(key):
+                if doc is not None:
+                    # The cached document is expired, but probably is still the latest revision
+                    try:
+                        res, _ = await self.revalidate(_id, f'"{doc["_rev"]}"')
+                    except NotFoundError:
+                        cache.invalidate(key)
+                        raise
+
+                    if res is None:
+                        cache.touch(key)
+                        return doc
+
+                    doc = res
+                else:
+                    doc = await self._query('GET', _id)
+
+                cache.put(key, doc)
+
+            return doc
+
+        return await self._query('GET', _id, params=params)
+
+    async def revalidate(self, _id: str, etag: Optional[str]) -> Tuple[Optional[dict], Optional[str]]:
+        """\
+        Returns the document and its ETag, or None and the same ETag if the document is not modified.
+
+        https://docs.couchdb.org/en/stable/api/document/common.html#head--db-docid
+        """
+
+        return await self._query('GET', _id, etag=etag, conditional=True)
 
     async def put(self, _id: str, doc: dict, *,
                   rev: Optional[str] = None,
                   batch: Optional[bool] = None,
-                  new_edits: Optional[bool] = None) -> dict:
+                  new_edits: Optional[bool] = None,
+                  skip_unchanged: bool = False) -> dict:
         """\
         Put new document or update existing document.
 
+        If `skip_unchanged` is set, the document is compared with the stored one and isn't written if its content
+        is the same. The stored document is taken from the document cache only if it has the revision
+        given by `rev` or `_rev`, otherwise it is fetched. The result of the skipped write has the current revision
+        and `skipped` set.
+
         https://docs.couchdb.org/en/stable/api/document/common.html#put--db-docid
         """
 
+        if skip_unchanged and new_edits is not False:
+            expected = rev or doc.get('_rev')
+            current = await self._current(_id, expected)
+
+            if current is not None and (expected is None or expected == current['_rev']) \
+                    and is_unchanged(doc, current):
+                return dict(ok=True, id=current['_id'], rev=current['_rev'], skipped=True)
+
+        params = dict(
+            rev=rev,
+            batch="ok" if batch else None,
+            new_edits=new_edits
+        )
+
+        cache = self._get_cache()
+
+        # Documents written with inline attachments are stored with stubs, so they can't be cached as is
+        if cache is None or batch or new_edits is False or '_attachments' in doc or doc.get('_deleted') \
+                or not await cache.ready():
+            res = await self._query('PUT', _id, params=params, data=doc)
+            self._invalidate(_id)
+            return res
+
+        key = self._get_key(_id)
+
+        with cache.pending(key):
+            res = await self._query('PUT', _id, params=params, data=doc)
+            cache.put(key, dict(doc, _id=key, _rev=res['rev']))
+
+        return res
+
+    async def update(self, _id: str, mutate: Mutation, *,
+                     create: bool = False,
+                     retries: int = 5,
+                     backoff: float = 0.05,
+                     max_backoff: float = 2.0) -> Optional[dict]:
+        """\
+        Atomically updates the document: fetches it, applies the mutation and puts the result with the fetched
+        revision. On a conflict the document is fetched again and the mutation is reapplied after a jittered
+        exponential backoff, DocumentUpdateConflict is raised when the retries are exhausted.
+
+        The mutation gets a copy of the document and returns the new document, or None to leave it unchanged;
+        it may be a coroutine function. A missing document is created from `{}` if `create` is set.
+        Returns the result of the put, or None if the document was left unchanged.
+        """
+
+        for attempt in range(retries + 1):
+            try:
+                doc = await self(_id)
+            except NotFoundError:
+                if not create:
+                    raise
+                doc = {}
+
+            new = mutate(doc)
+            if asyncio.iscoroutine(new):
+                new = await new
+
+            if new is None:
+                return None
+
+            try:
+                return await self.put(_id, new, rev=doc.get('_rev'))
+            except DocumentUpdateConflict:
+                # The cached revision may be outdated
+                self._invalidate(_id)
+
+                if attempt == retries:
+                    raise
+
+            await asyncio.sleep(backoff_delay(attempt, backoff, max_backoff))
+
+    async def put_multipart(self, _id: str, doc: dict, attachments: Dict[str, MultipartAttachment], *,
+                            rev: Optional[str] = None,
+                            batch: Optional[bool] = None,
+                            new_edits: Optional[bool] = None,
+                            chunk_size: int = 1 << 20) -> dict:
+        """\
+        Puts the document together with its attachments by a single multipart/related request.
+
+        Attachments are streamed as raw parts, without base64 encoding, and the document gets a single new revision.
+        Stubs of attachments already present in the document's `_attachments` are kept as is.
+
+        https://docs.couchdb.org/en/stable/api/document/common.html#creating-multiple-attachments
+        """
+
+        stream = _MultipartStream(doc, attachments, chunk_size)
+
         params = dict(
             rev=rev,
             batch="ok" if batch else None,
             new_edits=new_edits
         )
 
-        return await self.__connection.query('PUT', self._get_path(_id), params=params, data=doc)
+        headers = {'Content-Length': str(stream.length)}
+        data = StreamRequest(stream.content_type, stream)
+
+        try:
+            res = await self._query('PUT', _id, params=params, data=data, headers=headers)
+        finally:
+            stream.close()
+
+        self._invalidate(_id)
+
+        return res
 
     async def delete(self, _id: str, rev: str, *, batch: Optional[bool] = None) -> dict:
         """\
@@ -83,7 +254,10 @@ class BaseDocument:
             batch="ok" if batch else None,
         )
 
-        return await self.__connection.query('DELETE', self._get_path(_id), params=params)
+        res = await self._query('DELETE', _id, params=params)
+        self._invalidate(_id)
+
+        return res
 
     async def copy(self, _id: str, dst_id: str, *,
                    rev: Optional[str] = None,
@@ -104,7 +278,63 @@ class BaseDocument:
             batch="ok" if batch else None,
         )
 
-        return await self.__connection.query('COPY', self._get_path(_id), params=params, headers=headers)
+        res = await self.__connection.query('COPY', self._get_path(_id), params=params, headers=headers)
+        self._invalidate(dst_id)
+
+        return res
+
+    async def _query(self, method: str, _id: str, *, conditional: bool = False, **kwargs) -> Any:
+        path = self._get_path(_id)
+        router = self.__connection.shard_router
+        query = self.__connection.conditional_query if conditional else self.__connection.query
+
+        base_url = await self._route(router, _id) if router is not None else None
+
+        if base_url is not None:
+            try:
+                return await query(method, path, base_url=base_url, **kwargs)
+            except ClientConnectorError:
+                # The node is unreachable, the request wasn't sent, so go through the coordinator
+                router.mark_down(base_url)
+                router.invalidate(self.__database.name)
+
+        return await query(method, path, **kwargs)
+
+    async def _route(self, router: 'ShardRouter', _id: str) -> Optional[str]:
+        try:
+            return await router.url(self.__database.name, self._get_key(_id))
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Routing is an optimization, the coordinator serves the request anyway
+            return None
+
+    async def _current(self, _id: str, rev: Optional[str]) -> Optional[dict]:
+        cache = self._get_cache()
+
+        # A cached document may be outdated, so it is trusted only if the caller has seen the same revision
+        if cache is not None and rev is not None:
+            doc = cache.get(self._get_key(_id))
+
+            if doc is not None and doc['_rev'] == rev:
+                return doc
+
+        try:
+            return await self._query('GET', _id)
+        except NotFoundError:
+            return None
+
+    def _get_cache(self) -> Optional['DocumentCache']:
+        return self.__connection.doc_cache(self.__database.name)
+
+    def _invalidate(self, _id: str):
+        cache = self._get_cache()
+
+        if cache is not None:
+            cache.invalidate(self._get_key(_id))
+
+    def _get_key(self, _id: str) -> str:
+        return '/'.join(self._get_path(_id)[1:])
 
     def _get_path(self, _id: str) -> List[str]:
         raise NotImplementedError
@@ -121,5 +351,109 @@ class DesignDocument(BaseDocument):
 
 
 class LocalDocument(BaseDocument):
+    def _get_cache(self) -> Optional['DocumentCache']:
+        # Local documents don't appear in the changes feed, so the cache can't be kept coherent
+        return None
+
     def _get_path(self, _id: str) -> List[str]:
         return [self.database.name, '_local', _id]
+
+
+class _MultipartStream:
+    """\
+    Multipart/related body: the document JSON part followed by the attachments parts.
+
+    The body is sent again if the request is repeated after authentication. Bytes and files are just read again,
+    but async iterables can be consumed once, so their data is spooled while it is sent and replayed from the spool.
+    """
+
+    def __init__(self, doc: dict, attachments: Dict[str, MultipartAttachment], chunk_size: int):
+        self.__boundary = token_hex(16)
+        self.__chunk_size = chunk_size
+        self.__attachments = []
+        self.__spools: Dict[int, Tuple[SpooledTemporaryFile, Any]] = {}
+
+        # Parts are matched to the stubs with `follows` by their order, so the stubs follow the parts order
+        stubs = {name: stub for name, stub in (doc.get('_attachments') or {}).items() if name not in attachments}
+
+        for name, att in attachments.items():
+            length = att.length
+
+            if length is None:
+                if isinstance(att.data, (bytes, bytearray)):
+                    length = len(att.data)
+                elif isinstance(att.data, (str, os.PathLike)):
+                    length = os.path.getsize(att.data)
+                else:
+                    raise TypeError(f"Length of the attachment {name} should be set for an async iterable")
+
+            stubs[name] = dict(follows=True, content_type=att.content_type, length=length)
+            self.__attachments.append((att, length))
+
+        self.__doc = json.dumps(dict(doc, _attachments=stubs)).encode()
+
+    @property
+    def content_type(self) -> str:
+        return f'multipart/related; boundary="{self.__boundary}"'
+
+    @property
+    def length(self) -> int:
+        length = len(self._doc_part()) + len(self._tail())
+        for att, att_length in self.__attachments:
+            length += len(self._part_header(att)) + att_length
+
+        return length
+
+    async def __aiter__(self) -> AsyncGenerator[bytes, None]:
+        yield self._doc_part()
+
+        for index, (att, _) in enumerate(self.__attachments):
+            yield self._part_header(att)
+
+            if isinstance(att.data, (bytes, bytearray)):
+                yield att.data
+            elif isinstance(att.data, (str, os.PathLike)):
+                with open(att.data, 'rb') as f:
+                    while True:
+                        chunk = f.read(self.__chunk_size)
+                        if not chunk:
+                            break
+                        yield chunk
+            else:
+                async for chunk in self._spooled(index, att):
+                    yield chunk
+
+        yield self._tail()
+
+    async def _spooled(self, index: int, att: MultipartAttachment) -> AsyncGenerator[bytes, None]:
+        if index not in self.__spools:
+            self.__spools[index] = (SpooledTemporaryFile(max_size=self.__chunk_size), att.data.__aiter__())
+
+        spool, iterator = self.__spools[index]
+
+        # Replays the data sent before, then continues with the rest of the iterable, if it wasn't sent entirely
+        spool.seek(0)
+        while True:
+            chunk = spool.read(self.__chunk_size)
+            if not chunk:
+                break
+            yield chunk
+
+        async for chunk in iterator:
+            spool.write(chunk)
+            yield chunk
+
+    def close(self):
+        for spool, _ in self.__spools.values():
+            spool.close()
+
+        self.__spools.clear()
+
+    def _doc_part(self) -> bytes:
+        return f'--{self.__boundary}\r\nContent-Type: application/json\r\n\r\n'.encode() + self.__doc
+
+    def _part_header(self, att: MultipartAttachment) -> bytes:
+        return f'\r\n--{self.__boundary}\r\nContent-Type: {att.content_type}\r\n\r\n'.encode()
+
+    def _tail(self) -> bytes:
+        return f'\r\n--{self.__boundary}--'.encode()
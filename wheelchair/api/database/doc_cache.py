@@ -0,0 +1,270 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+from copy import deepcopy
+from typing import Dict, Iterator, List, Optional, Tuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .database import Database
+    from ..connection import Connection
+
+logger = logging.getLogger('wheelchair')
+
+
+class DocumentCacheStats:
+    __slots__ = ('hits', 'misses', 'revalidations', 'evictions', 'invalidations', 'refreshes')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.refreshes = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def as_dict(self) -> dict:
+        return dict(
+            hits=self.hits,
+            misses=self.misses,
+            revalidations=self.revalidations,
+            evictions=self.evictions,
+            invalidations=self.invalidations,
+            refreshes=self.refreshes,
+            hit_ratio=self.hit_ratio,
+        )
+
+
+class DocumentCache:
+    """\
+    Cache of the latest revisions of documents of a database, enable it with `Connection.enable_doc_cache()`.
+
+    Documents are cached when they are read or written without options and evicted by LRU when there are more
+    than `max_size` of them. Documents older than `ttl` seconds are revalidated by a conditional request
+    with their revision as the ETag. A background changes feed keeps
+    the cache coherent: a changed document is evicted, or fetched again if `refresh` is set.
+
+    The feed starts from the `update_seq` of the database, and nothing is cached until it is established.
+    Changes seen while a document is being read or written are recorded, so a revision outdated
+    by the time its request completes isn't cached. If the feed fails, the cache is cleared
+    and the feed is resumed from the last seen sequence.
+
+    https://docs.couchdb.org/en/stable/api/database/changes.html
+    """
+
+    def __init__(self, connection: 'Connection', database: str, *,
+                 max_size: int = 1000,
+                 ttl: Optional[float] = 60.0,
+                 refresh: bool = False,
+                 heartbeat: int = 30000,
+                 retry_delay: float = 5.0):
+        assert max_size > 0, "Max size should be positive"
+
+        self.__connection = connection
+        self.__database = database
+        self.__max_size = max_size
+        self.__ttl = ttl
+        self.__refresh = refresh
+        self.__heartbeat = heartbeat
+        self.__retry_delay = retry_delay
+        self.__docs: 'OrderedDict[str, Tuple[float, dict]]' = OrderedDict()
+        self.__stats = DocumentCacheStats()
+        self.__watcher: Optional[asyncio.Future] = None
+        self.__established: Optional[asyncio.Future] = None
+        self.__pending: Dict[str, List] = {}
+
+    @property
+    def database(self) -> str:
+        return self.__database
+
+    @property
+    def stats(self) -> DocumentCacheStats:
+        return self.__stats
+
+    def __len__(self) -> int:
+        return len(self.__docs)
+
+    def __contains__(self, _id: str) -> bool:
+        return _id in self.__docs
+
+    def lookup(self, _id: str) -> Tuple[Optional[dict], bool]:
+        """\
+        Returns a copy of the cached document and whether it is fresh, or None if the document is not cached.
+        An expired document is kept, so it can be revalidated by its revision.
+        """
+
+        self._watch()
+
+        entry = self.__docs.get(_id)
+
+        if entry is None:
+            self.__stats.misses += 1
+            return None, False
+
+        self.__docs.move_to_end(_id)
+
+        if self.__ttl is not None and entry[0] < time.monotonic():
+            self.__stats.revalidations += 1
+            return deepcopy(entry[1]), False
+
+        self.__stats.hits += 1
+        return deepcopy(entry[1]), True
+
+    def get(self, _id: str) -> Optional[dict]:
+        """Returns a copy of the cached document or None if it is not cached or expired."""
+
+        doc, fresh = self.lookup(_id)
+        return doc if fresh else None
+
+    def touch(self, _id: str):
+        """Renews the TTL of the cached document, e.g. after it has been revalidated."""
+
+        entry = self.__docs.get(_id)
+
+        if entry is not None and self.__ttl is not None:
+            self.__docs[_id] = (time.monotonic() + self.__ttl, entry[1])
+
+    async def ready(self) -> bool:
+        """Starts the changes feed if it isn't running and returns whether it is established."""
+
+        self._watch()
+        return await asyncio.shield(self.__established)
+
+    @contextmanager
+    def pending(self, _id: str) -> Iterator[None]:
+        """Records changes of the document while it is being read or written, wrap requests with it."""
+
+        entry = self.__pending.setdefault(_id, [0, None])
+        entry[0] += 1
+
+        try:
+            yield
+        finally:
+            entry[0] -= 1
+
+            if not entry[0]:
+                del self.__pending[_id]
+
+    def put(self, _id: str, doc: dict):
+        """\
+        Caches a copy of the document unless a newer revision is cached already, the document has changed
+        while it was pending, or the changes feed isn't established.
+        """
+
+        if self.__established is None or not self.__established.done() or not self.__established.result():
+            return
+
+        pending = self.__pending.get(_id)
+
+        if pending is not None and pending[1] is not None and pending[1] != doc.get('_rev'):
+            self.invalidate(_id)
+            return
+
+        entry = self.__docs.get(_id)
+
+        if entry is not None and _rev_number(entry[1].get('_rev')) > _rev_number(doc.get('_rev')):
+            return
+
+        expires = time.monotonic() + self.__ttl if self.__ttl is not None else 0.0
+        self.__docs[_id] = (expires, deepcopy(doc))
+        self.__docs.move_to_end(_id)
+
+        while len(self.__docs) > self.__max_size:
+            self.__docs.popitem(last=False)
+            self.__stats.evictions += 1
+
+    def invalidate(self, _id: str):
+        if self.__docs.pop(_id, None) is not None:
+            self.__stats.invalidations += 1
+
+    def clear(self):
+        self.__docs.clear()
+
+    def close(self):
+        """Stops the changes feed and clears the cache."""
+
+        if self.__watcher is not None:
+            self.__watcher.cancel()
+            self.__watcher = None
+
+        if self.__established is not None and not self.__established.done():
+            self.__established.set_result(False)
+
+        self.clear()
+
+    def _watch(self):
+        if self.__watcher is None or self.__watcher.done():
+            self.__established = asyncio.get_event_loop().create_future()
+            self.__watcher = asyncio.ensure_future(self._follow(self.__established))
+
+    async def _follow(self, established: asyncio.Future):
+        database = self.__connection.db(self.__database)
+
+        try:
+            since = (await database())['update_seq']
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Changes feed of the document cache of %s can't be started: %r", self.__database, e)
+            established.set_result(False)
+            return
+
+        established.set_result(True)
+
+        while True:
+            try:
+                res = await database.changes(since=since, timeout=self.__heartbeat)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.warning("Changes feed of the document cache of %s failed: %r", self.__database, e)
+                self.clear()
+                await asyncio.sleep(self.__retry_delay)
+                continue
+
+            since = res['last_seq']
+
+            for row in res['results']:
+                await self._changed(database, row)
+
+    async def _changed(self, database: 'Database', row: dict):
+        _id = row['id']
+        pending = self.__pending.get(_id)
+
+        if pending is not None:
+            pending[1] = row['changes'][0]['rev']
+
+        entry = self.__docs.get(_id)
+
+        if entry is None or entry[1].get('_rev') == row['changes'][0]['rev']:
+            return
+
+        self.invalidate(_id)
+
+        if self.__refresh and not row.get('deleted'):
+            try:
+                # Design documents are addressed by two path segments
+                path = [database.name] + _id.split('/', 1) if _id.startswith('_design/') else [database.name, _id]
+                self.put(_id, await self.__connection.query('GET', path))
+                self.__stats.refreshes += 1
+            except Exception as e:
+                logger.debug("Refresh of %s in the document cache failed: %r", _id, e)
+
+
+def _rev_number(rev: Optional[str]) -> int:
+    if not rev:
+        return 0
+
+    return int(rev.split('-', 1)[0])
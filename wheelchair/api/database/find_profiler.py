@@ -0,0 +1,150 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import json
+import time
+from collections import Counter, deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+PLACEHOLDER = '?'
+_COMBINATION_OPERATORS = {'$and', '$or', '$nor', '$not', '$elemMatch', '$allMatch', '$keyMapMatch'}
+
+
+def query_shape(selector: Any) -> Any:
+    """\
+    Strips values from the selector, keeping fields and operators only,
+    so the queries which differ by arguments have the same shape.
+    """
+
+    if isinstance(selector, dict):
+        shape = {}
+
+        for key, value in selector.items():
+            if not key.startswith('$') or key in _COMBINATION_OPERATORS:
+                shape[key] = query_shape(value)
+            else:
+                shape[key] = PLACEHOLDER
+
+        return shape
+
+    if isinstance(selector, list) and any(isinstance(v, dict) for v in selector):
+        return [query_shape(v) for v in selector]
+
+    return PLACEHOLDER
+
+
+class ShapeStats:
+    __slots__ = ('database', 'partitioned', 'shape', 'sort', 'calls', 'latencies', 'total_time',
+                 'keys_examined', 'docs_examined', 'results_returned', 'indexes')
+
+    def __init__(self, database: str, partitioned: bool, shape: Any, sort: Any, max_samples: int):
+        self.database = database
+        self.partitioned = partitioned
+        self.shape = shape
+        self.sort = sort
+        self.calls = 0
+        self.latencies = deque(maxlen=max_samples)
+        self.total_time = 0.0
+        self.keys_examined = 0
+        self.docs_examined = 0
+        self.results_returned = 0
+        self.indexes = Counter()
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.latencies:
+            return None
+
+        latencies = sorted(self.latencies)
+        return latencies[min(int(len(latencies) * p), len(latencies) - 1)]
+
+    def as_dict(self) -> dict:
+        return dict(
+            database=self.database,
+            partitioned=self.partitioned,
+            shape=self.shape,
+            sort=self.sort,
+            calls=self.calls,
+            total_time=self.total_time,
+            p50=self.percentile(0.5),
+            p90=self.percentile(0.9),
+            p99=self.percentile(0.99),
+            keys_examined=self.keys_examined,
+            docs_examined=self.docs_examined,
+            results_returned=self.results_returned,
+            examined_ratio=self.docs_examined / max(self.results_returned, 1),
+            indexes=dict(self.indexes),
+        )
+
+
+class FindProfiler:
+    """\
+    Collects execution statistics of find requests grouped by a query shape.
+
+    Enable it with `Connection.enable_find_profiler()`; every find request of the connection
+    is then executed with execution stats. Execution stats don't name the used index, so the query
+    is explained on the first call of a shape, and again once `explain_ttl` seconds have passed,
+    so new indexes are picked up. Without `explain` the index breakdown of the report is empty.
+
+    https://docs.couchdb.org/en/stable/api/database/find.html#execution-statistics
+    """
+
+    def __init__(self, max_samples: int = 1000, explain: bool = True, explain_ttl: float = 60.0):
+        self.__max_samples = max_samples
+        self.__explain = explain
+        self.__explain_ttl = explain_ttl
+        self.__shapes: Dict[str, ShapeStats] = {}
+        self.__indexes: Dict[str, Tuple[str, float]] = {}
+
+    async def profile(self, database: str, partitioned: bool, data: dict,
+                      find: Callable[[dict], Awaitable[dict]],
+                      explain: Callable[[dict], Awaitable[dict]]) -> dict:
+        requested = data.get('execution_stats')
+        data = dict(data, execution_stats=True)
+
+        shape, sort = query_shape(data['selector']), data.get('sort')
+        key = json.dumps([database, partitioned, shape, sort, data.get('use_index')], sort_keys=True)
+
+        stats = self.__shapes.get(key)
+        if stats is None:
+            stats = self.__shapes[key] = ShapeStats(database, partitioned, shape, sort, self.__max_samples)
+
+        index = None
+
+        if self.__explain:
+            index, expires = self.__indexes.get(key, (None, 0.0))
+
+            if expires < time.monotonic():
+                res = await explain({k: v for k, v in data.items() if k != 'conflicts'})
+                index = res['index']['name']
+                self.__indexes[key] = (index, time.monotonic() + self.__explain_ttl)
+
+        started = time.monotonic()
+        res = await find(data)
+        elapsed = time.monotonic() - started
+
+        stats.calls += 1
+        stats.latencies.append(elapsed)
+        stats.total_time += elapsed
+
+        if index is not None:
+            stats.indexes[index] += 1
+
+        execution_stats = res.get('execution_stats', {}) if requested else res.pop('execution_stats', {})
+        stats.keys_examined += execution_stats.get('total_keys_examined', 0)
+        stats.docs_examined += execution_stats.get('total_docs_examined', 0)
+        stats.results_returned += execution_stats.get('results_returned', len(res.get('docs', ())))
+
+        return res
+
+    def report(self) -> List[dict]:
+        """Returns statistics per query shape, the most time consuming first."""
+
+        report = [stats.as_dict() for stats in self.__shapes.values()]
+        report.sort(key=lambda s: s['total_time'], reverse=True)
+        return report
+
+    def reset(self):
+        self.__shapes.clear()
+        self.__indexes.clear()
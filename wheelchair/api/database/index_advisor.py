@@ -0,0 +1,174 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+from typing import Optional, List, Union, Tuple, Iterable, NamedTuple
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .database import Database
+
+_EQUALITY_OPERATORS = {'$eq'}
+_RANGE_OPERATORS = {'$gt', '$gte', '$lt', '$lte', '$beginsWith'}
+
+
+class MangoQuery(NamedTuple):
+    selector: dict
+    sort: Optional[List[Union[str, dict]]] = None
+    fields: Optional[List[str]] = None
+    use_index: Optional[Union[str, Tuple[str]]] = None
+
+
+class IndexAdvice(NamedTuple):
+    query: MangoQuery
+    index: dict
+    full_scan: bool
+    execution_stats: Optional[dict]
+    examined_ratio: Optional[float]
+    suggestion: Optional[dict]
+
+
+class IndexAdvisor:
+    def __init__(self, database: 'Database'):
+        self.__database = database
+
+    @property
+    def database(self) -> 'Database':
+        return self.__database
+
+    async def __call__(self, queries: Iterable[Union[dict, MangoQuery]], *,
+                       execute: bool = True,
+                       max_ratio: float = 10.0,
+                       concurrency: int = 4) -> List[IndexAdvice]:
+        """\
+        Runs every query through explain and, if execute is set, through find with execution stats.
+
+        A query gets a suggested index when it falls back to `_all_docs` or examines more than `max_ratio`
+        documents per returned one. The suggestion contains arguments for `Index.post`, so it can be created
+        as is: `await db.index.post(**advice.suggestion)`.
+
+        https://docs.couchdb.org/en/stable/api/database/find.html#post--db-_explain
+        https://docs.couchdb.org/en/stable/api/database/find.html#execution-statistics
+        """
+
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def advise(query: MangoQuery) -> IndexAdvice:
+            async with semaphore:
+                return await self.advise(query, execute=execute, max_ratio=max_ratio)
+
+        queries = [q if isinstance(q, MangoQuery) else MangoQuery(q) for q in queries]
+        return list(await asyncio.gather(*(advise(q) for q in queries)))
+
+    async def advise(self, query: MangoQuery, *, execute: bool = True, max_ratio: float = 10.0) -> IndexAdvice:
+        """Analyzes a single query."""
+
+        explain = await self.__database.explain(query.selector, sort=query.sort, fields=query.fields,
+                                                use_index=query.use_index)
+        index = explain['index']
+        full_scan = index['type'] == 'special'
+
+        stats, ratio = None, None
+
+        if execute:
+            res = await self.__database.find(query.selector, sort=query.sort, fields=query.fields,
+                                             use_index=query.use_index, execution_stats=True)
+            stats = res.get('execution_stats')
+
+            if stats is not None:
+                ratio = stats['total_docs_examined'] / max(stats['results_returned'], 1)
+
+        suggestion = None
+
+        if full_scan or (ratio is not None and ratio > max_ratio):
+            suggestion = self.suggest(query.selector, query.sort)
+
+            if suggestion is not None and self._index_fields(index) == suggestion['index']['fields']:
+                suggestion = None  # The best index we could offer is already in use
+
+        return IndexAdvice(query, index, full_scan, stats, ratio, suggestion)
+
+    @classmethod
+    def suggest(cls, selector: dict, sort: Optional[List[Union[str, dict]]] = None) -> Optional[dict]:
+        """\
+        Builds an index definition for the selector: equality fields go first, then sort or range fields.
+        Conditions a json index can't serve are moved into the partial filter selector.
+
+        Returns keyword arguments for `Index.post` or None if there is nothing to index.
+        """
+
+        equality, ranges, partial = [], [], {}
+        cls._classify(selector, '', equality, ranges, partial)
+
+        fields = list(equality)
+        for field in cls._sort_fields(sort) or ranges:
+            if field not in fields:
+                fields.append(field)
+
+        if not fields:
+            return None
+
+        suggestion = dict(index=dict(fields=fields))
+        if partial:
+            suggestion['selector'] = partial
+
+        return suggestion
+
+    @classmethod
+    def _classify(cls, selector: dict, prefix: str, equality: list, ranges: list, partial: dict):
+        for key, arg in selector.items():
+            if key == '$and':
+                for sub in arg:
+                    cls._classify(sub, prefix, equality, ranges, partial)
+                continue
+
+            if key.startswith('$'):
+                partial.setdefault('$and', []).append({prefix[:-1]: {key: arg}} if prefix else {key: arg})
+                continue
+
+            field = prefix + key
+
+            if not isinstance(arg, dict) or not arg:
+                equality.append(field)
+                continue
+
+            if not any(k.startswith('$') for k in arg):
+                cls._classify(arg, field + '.', equality, ranges, partial)
+                continue
+
+            for op, value in arg.items():
+                if op in _EQUALITY_OPERATORS:
+                    equality.append(field)
+                elif op in _RANGE_OPERATORS:
+                    ranges.append(field)
+                else:
+                    partial.setdefault(field, {})[op] = value
+
+        if len(partial.get('$and', ())) == 1:
+            partial.update(partial.pop('$and')[0])
+
+    @staticmethod
+    def _sort_fields(sort: Optional[List[Union[str, dict]]]) -> List[str]:
+        fields = []
+
+        for item in sort or ():
+            if isinstance(item, str):
+                fields.append(item)
+            else:
+                fields.extend(item.keys())
+
+        return fields
+
+    @staticmethod
+    def _index_fields(index: dict) -> List[str]:
+        fields = []
+
+        for item in index.get('def', {}).get('fields', ()):
+            if isinstance(item, str):
+                fields.append(item)
+            else:
+                fields.extend(item.keys())
+
+        return fields
@@ -3,12 +3,14 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
-from typing import Optional, List, Union, Tuple
+import asyncio
+import heapq
+from typing import Optional, List, Union, Tuple, Iterable, Callable, Awaitable, Dict, Any
 from typing import TYPE_CHECKING
 
 from .design import PartitionDesignProxy
 from .view import PartitionAllDocsView
-from ..utils import StaleOptions
+from ..utils import StaleOptions, collation_key, split_field, get_field, MISSING
 
 if TYPE_CHECKING:
     from .database import Database
@@ -25,6 +27,157 @@ class PartitionProxy:
     def __getattr__(self, attr) -> 'Partition':
         return Partition(self.__database, attr)
 
+    async def find(self, partitions: Iterable[str], selector: dict, *,
+                   limit: Optional[int] = None,
+                   sort: Optional[List[Union[str, dict]]] = None,
+                   fields: Optional[List[str]] = None,
+                   use_index: Optional[Union[str, Tuple[str]]] = None,
+                   r: Optional[int] = None,
+                   update: Optional[bool] = None,
+                   stable: Optional[bool] = None,
+                   stale: Optional[Union[bool, StaleOptions]] = None,
+                   concurrency: int = 8) -> dict:
+        """\
+        Executes find request for each of the given partitions and merges the results.
+
+        At most `concurrency` requests are running at once. Each partition is queried with the same `limit`,
+        so when the `sort` is given the merged result is the global top of `limit` documents. Without the `sort`
+        the outstanding requests are cancelled as soon as `limit` documents are collected.
+
+        The server collates strings by ICU rules, which can't be reproduced on the client, so the sort fields
+        should have non-string values, otherwise ValueError is raised. Sort fields missing in `fields` are
+        requested for the merge and removed from the returned documents.
+
+        Returns dict with merged `docs` and `bookmarks` of every queried partition.
+
+        https://docs.couchdb.org/en/stable/api/partitioned-dbs.html#get--db-_partition-partition_id-_find
+        """
+
+        order, descending = self._parse_sort(sort)
+
+        added = []
+
+        if order and fields is not None:
+            added = [f for f in order if f not in fields]
+            fields = fields + added
+
+        paths = [split_field(f) for f in order]
+        bookmarks = {}
+
+        async def fetch(partition: 'Partition') -> List[dict]:
+            res = await partition.find(selector, limit=limit, sort=sort, fields=fields, use_index=use_index, r=r,
+                                       update=update, stable=stable, stale=stale)
+            bookmarks[partition.name] = res.get('bookmark')
+            return res['docs']
+
+        def key(doc: dict) -> tuple:
+            values = (get_field(doc, path) for path in paths)
+            return tuple(_merge_key(None if v is MISSING else v) for v in values)
+
+        docs = await self._gather(partitions, fetch, key if order else None, descending, limit, concurrency)
+
+        if added:
+            requested = [split_field(f) for f in fields if f not in added]
+
+            for doc in docs:
+                for field in added:
+                    _remove_field(doc, split_field(field), requested)
+
+        return dict(docs=docs, bookmarks=bookmarks)
+
+    async def view(self, partitions: Iterable[str], ddoc: str, view: str, *,
+                   limit: Optional[int] = None,
+                   descending: Optional[bool] = None,
+                   concurrency: int = 8,
+                   **kwargs: Any) -> dict:
+        """\
+        Executes a partitioned view for each of the given partitions and merges rows by key and document id.
+
+        Other keyword arguments are passed to the view as is. Reduced results can't be merged,
+        so the view should be queried with `reduce=False` if it has a reduce function. Keys of the view
+        should be non-string values or arrays of them, since the server collates strings by ICU rules,
+        otherwise ValueError is raised.
+
+        https://docs.couchdb.org/en/stable/api/partitioned-dbs.html#get--db-_partition-partition-_design-design-doc-_view-view-name
+        """
+
+        async def fetch(partition: 'Partition') -> List[dict]:
+            res = await partition.design(ddoc).view(view)(limit=limit, descending=descending, **kwargs)
+            return res['rows']
+
+        def key(row: dict) -> tuple:
+            # Rows with the same key are ordered by raw document ids
+            return _merge_key(row['key']), row.get('id')
+
+        rows = await self._gather(partitions, fetch, key, bool(descending), limit, concurrency)
+        return dict(rows=rows)
+
+    async def _gather(self, partitions: Iterable[str],
+                      fetch: Callable[['Partition'], Awaitable[List[dict]]],
+                      key: Optional[Callable[[dict], Any]],
+                      descending: bool,
+                      limit: Optional[int],
+                      concurrency: int) -> List[dict]:
+        assert concurrency > 0, "Concurrency should be positive"
+
+        names = enumerate(partitions)
+        results: Dict[int, List[dict]] = {}
+        collected = 0
+        pending = {}
+
+        try:
+            while True:
+                while len(pending) < concurrency:
+                    index, name = next(names, (None, None))
+                    if name is None:
+                        break
+
+                    pending[asyncio.ensure_future(fetch(self(name)))] = index
+
+                if not pending:
+                    break
+
+                done, _ = await asyncio.wait(pending.keys(), return_when=asyncio.FIRST_COMPLETED)
+
+                for task in done:
+                    rows = results[pending.pop(task)] = task.result()
+                    collected += len(rows)
+
+                if key is None and limit is not None and collected >= limit:
+                    break
+        finally:
+            for task in pending:
+                if not task.cancel() and not task.cancelled():
+                    # The task has finished too, its exception is retrieved, so it isn't logged as never retrieved
+                    task.exception()
+
+        ordered = [results[i] for i in sorted(results)]
+
+        if key is None:
+            merged = [row for rows in ordered for row in rows]
+        else:
+            merged = list(heapq.merge(*ordered, key=key, reverse=descending))
+
+        return merged[:limit] if limit is not None else merged
+
+    @staticmethod
+    def _parse_sort(sort: Optional[List[Union[str, dict]]]) -> Tuple[List[str], bool]:
+        order, directions = [], set()
+
+        for item in sort or ():
+            if isinstance(item, str):
+                order.append(item)
+                directions.add('asc')
+            else:
+                for field, direction in item.items():
+                    order.append(field)
+                    directions.add(direction)
+
+        if len(directions) > 1:
+            raise ValueError("All fields of the sort should use the same direction")
+
+        return order, directions == {'desc'}
+
 
 class Partition:
     def __init__(self, database: 'Database', name: str):
@@ -97,7 +250,17 @@ class Partition:
         )
 
         path = [self.database.name, '_partition', self.__name, '_find']
-        return await self.__connection.query('POST', path, data=data)
+        profiler = self.__connection.find_profiler
+
+        if profiler is None:
+            return await self.__connection.query('POST', path, data=data)
+
+        explain_path = [self.database.name, '_partition', self.__name, '_explain']
+        return await profiler.profile(
+            self.database.name, True, data,
+            lambda d: self.__connection.query('POST', path, data=d),
+            lambda d: self.__connection.query('POST', explain_path, data=d),
+        )
 
     async def explain(self,
                       selector: dict,
@@ -135,3 +298,43 @@ class Partition:
 
         path = [self.database.name, '_partition', self.__name, '_explain']
         return await self.__connection.query('POST', path, data=data)
+
+
+def _merge_key(value: Any) -> tuple:
+    if _has_strings(value):
+        raise ValueError(f"Results sorted by string values can't be merged in the server's ICU order: {value!r}")
+
+    return collation_key(value)
+
+
+def _has_strings(value: Any) -> bool:
+    if isinstance(value, str):
+        return True
+
+    if isinstance(value, (list, tuple)):
+        return any(_has_strings(v) for v in value)
+
+    # Objects are collated by their keys too
+    return isinstance(value, dict) and bool(value)
+
+
+def _remove_field(doc: dict, path: List[str], requested: List[List[str]]):
+    if any(path[:len(r)] == r for r in requested):
+        # The field is returned as a part of a requested object
+        return
+
+    parents = [doc]
+
+    for part in path[:-1]:
+        value = parents[-1].get(part)
+        if not isinstance(value, dict):
+            return
+        parents.append(value)
+
+    parents[-1].pop(path[-1], None)
+
+    # Objects left empty contain no requested fields, so they wouldn't be returned without the added one
+    for depth in range(len(path) - 1, 0, -1):
+        if parents[depth]:
+            break
+        parents[depth - 1].pop(path[depth - 1], None)
@@ -0,0 +1,145 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import random
+import struct
+import time
+import zlib
+from typing import Dict, List, NamedTuple, Optional, Tuple
+from typing import TYPE_CHECKING
+from urllib.parse import urlsplit
+
+if TYPE_CHECKING:
+    from ..connection import Connection
+
+
+def shard_hash(doc_id: str, partitioned: bool = False) -> int:
+    """\
+    Hashes the document id the same way CouchDB does to pick its shard:
+    crc32 of the id encoded in the Erlang external term format.
+    Documents of a partitioned database are placed by their partition.
+    """
+
+    if partitioned and not doc_id.startswith('_') and ':' in doc_id:
+        doc_id = doc_id.split(':', 1)[0]
+
+    data = doc_id.encode()
+    return zlib.crc32(b'\x83m' + struct.pack('>I', len(data)) + data)
+
+
+class ShardMap(NamedTuple):
+    ranges: List[Tuple[int, int, List[str]]]
+    partitioned: bool
+    expires: float
+
+    def nodes(self, doc_id: str) -> List[str]:
+        """Returns the nodes owning the document's shard."""
+
+        h = shard_hash(doc_id, self.partitioned)
+
+        for start, end, nodes in self.ranges:
+            if start <= h <= end:
+                return nodes
+
+        return []
+
+
+class ShardRouter:
+    """\
+    Routes single document requests directly to a node owning the document's shard, saving the hop from
+    the coordinating node. Shard maps of the databases are cached for `ttl` seconds, so the routing follows
+    resharding with that delay; a request routed to a node not owning the shard anymore still succeeds.
+
+    Requests are routed only to the nodes with URLs given by `node_urls`, others go through the connection's URL.
+    The session cookie of the connection is sent to these URLs. Addresses of the nodes in the cluster usually
+    differ from the public endpoint, so URLs are derived from node names like `couchdb@10.0.0.1`,
+    with the scheme and the port of the connection, only if `derive_urls` is set.
+
+    A node failed to connect is skipped for `down_time` seconds. Requests fall back to the connection's URL
+    if the document can't be routed, e.g. its shard map can't be fetched.
+
+    https://docs.couchdb.org/en/stable/cluster/sharding.html
+    """
+
+    def __init__(self, connection: 'Connection', *,
+                 node_urls: Optional[Dict[str, str]] = None,
+                 derive_urls: bool = False,
+                 ttl: float = 300.0,
+                 down_time: float = 30.0):
+        self.__connection = connection
+        self.__node_urls = dict(node_urls or {})
+        self.__derive_urls = derive_urls
+        self.__ttl = ttl
+        self.__down_time = down_time
+        self.__maps: Dict[str, ShardMap] = {}
+        self.__down: Dict[str, float] = {}
+
+    async def shard_map(self, database: str) -> ShardMap:
+        shard_map = self.__maps.get(database)
+
+        if shard_map is None or shard_map.expires < time.monotonic():
+            shard_map = await self.refresh(database)
+
+        return shard_map
+
+    async def refresh(self, database: str) -> ShardMap:
+        """Fetches the shard map of the database."""
+
+        db = self.__connection.db(database)
+
+        shards = await db.shards()
+        info = await db()
+
+        ranges = []
+        for key, nodes in shards.items():
+            start, end = key.split('-')
+            ranges.append((int(start, 16), int(end, 16), nodes))
+
+        ranges.sort()
+
+        shard_map = ShardMap(ranges, bool(info.get('props', {}).get('partitioned')), time.monotonic() + self.__ttl)
+        self.__maps[database] = shard_map
+        return shard_map
+
+    def invalidate(self, database: Optional[str] = None):
+        """Drops the cached shard map of the database or all of them."""
+
+        if database is None:
+            self.__maps.clear()
+        else:
+            self.__maps.pop(database, None)
+
+    def mark_down(self, url: str):
+        """Skips the node with the base URL for `down_time` seconds."""
+
+        self.__down[url] = time.monotonic() + self.__down_time
+
+    async def url(self, database: str, doc_id: str) -> Optional[str]:
+        """Returns the base URL of an available node owning the document, or None to use the connection's URL."""
+
+        shard_map = await self.shard_map(database)
+        now = time.monotonic()
+        urls = [url for url in map(self.node_url, shard_map.nodes(doc_id))
+                if url is not None and self.__down.get(url, 0.0) <= now]
+
+        return random.choice(urls) if urls else None
+
+    def node_url(self, node: str) -> Optional[str]:
+        """Returns the base URL of the node, or None if it isn't configured and can't be derived from the name."""
+
+        if node in self.__node_urls:
+            return self.__node_urls[node]
+
+        if not self.__derive_urls:
+            return None
+
+        host = node.split('@', 1)[-1]
+
+        if host == 'nohost':
+            # A single node setup
+            return None
+
+        p = urlsplit(self.__connection.url)
+        return f'{p.scheme}://{host}:{p.port}/'
@@ -4,7 +4,7 @@
 
 
 import json
-from typing import Any, Optional, Union, List, NamedTuple
+from typing import Any, Optional, Union, List, NamedTuple, Tuple
 from typing import TYPE_CHECKING
 
 from ..utils import StaleOptions
@@ -128,6 +128,23 @@ class BaseView:
 
         return await self.__connection.query('POST', path, data=data)
 
+    async def revalidate(self, etag: Optional[str], **kwargs) -> Tuple[Optional[dict], Optional[str]]:
+        """\
+        Executes a view function by a GET request, takes the same arguments as the call.
+        Returns the result and its ETag, or None and the same ETag if the result is not modified.
+
+        https://docs.couchdb.org/en/stable/api/ddoc/views.html#get--db-_design-ddoc-_view-view
+        """
+
+        params = ViewQuery(**kwargs)._asdict()
+        params['stale'] = StaleOptions.format(params['stale'])
+
+        for field in ('key', 'keys', 'start_key', 'end_key'):
+            if params[field] is not None:
+                params[field] = json.dumps(params[field])
+
+        return await self.__connection.conditional_query('GET', self._get_path(), etag, params=params)
+
     def _get_path(self) -> List[str]:
         raise NotImplementedError
 
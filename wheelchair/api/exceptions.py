@@ -48,6 +48,18 @@ class RequestError(Exception):
         return exception(code, error, reason)
 
 
+class AttachmentIntegrityError(Exception):
+    """Downloaded attachment doesn't match its length or digest."""
+
+
+class UUIDPoolExhausted(Exception):
+    """UUID pool is empty and there is no fallback generator."""
+
+
+class ModelValidationError(ValueError):
+    """Document doesn't match fields of the model."""
+
+
 @RequestError.register_exception
 class BadRequestError(RequestError):
     name = 'bad_request'
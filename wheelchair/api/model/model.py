@@ -0,0 +1,343 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import types
+import typing
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Type, TypeVar, Union
+
+from ..exceptions import ModelValidationError
+from ..utils.fields import MISSING
+
+T = TypeVar('T', bound='Model')
+
+Converter = Callable[[Any], Any]
+
+# `X | Y` unions of Python 3.10+
+UnionType = getattr(types, 'UnionType', None)
+
+
+class Field:
+    """\
+    Options of a model field: the default value or a factory of it, the document key if it differs
+    from the field name, and an additional validator returning False for invalid values.
+    """
+
+    __slots__ = ('default', 'default_factory', 'key', 'validator')
+
+    def __init__(self, default: Any = MISSING, *,
+                 default_factory: Optional[Callable[[], Any]] = None,
+                 key: Optional[str] = None,
+                 validator: Optional[Callable[[Any], bool]] = None):
+        assert default is MISSING or default_factory is None, "Either default or default factory may be set"
+
+        if isinstance(default, (list, dict, set)):
+            raise ValueError(f"Mutable default {type(default).__name__} is not allowed, use default_factory")
+
+        self.default = default
+        self.default_factory = default_factory
+        self.key = key
+        self.validator = validator
+
+    @property
+    def required(self) -> bool:
+        return self.default is MISSING and self.default_factory is None
+
+    def get_default(self) -> Any:
+        return self.default_factory() if self.default_factory is not None else self.default
+
+
+class ModelMeta(type):
+    def __new__(mcs, name: str, bases: tuple, namespace: dict):
+        annotations = namespace.get('__annotations__', {})
+        fields = {}
+
+        for field in annotations:
+            if field.startswith('__'):
+                continue
+
+            spec = namespace.pop(field, MISSING)
+
+            if isinstance(spec, (list, dict, set)):
+                # The default would be shared by all the instances, the same way dataclasses reject it
+                raise ValueError(f"{name}: mutable default {type(spec).__name__} for field {field} is not allowed, "
+                                 f"use default_factory")
+
+            fields[field] = spec if isinstance(spec, Field) else Field(spec)
+
+        namespace['__slots__'] = tuple(fields) + namespace.get('__slots__', ())
+
+        cls = super().__new__(mcs, name, bases, namespace)
+
+        inherited = {}
+        for base in reversed(cls.__mro__[1:]):
+            inherited.update(getattr(base, '_fields', {}))
+
+        cls._fields = dict(inherited, **fields)
+        cls._codec = None
+        return cls
+
+
+class Model(metaclass=ModelMeta):
+    """\
+    Base class of typed documents.
+
+    Fields are declared by annotations, like dataclasses, and stored in slots. Values are validated against
+    the annotated types: str, int, float, bool, dict, list, Any, models, and Optional, Union (or `X | Y`),
+    List and Dict of them. Mutable defaults are rejected, like in dataclasses, use `Field(default_factory=...)`.
+    The validation is compiled once per model on first use. Keys of the document not declared as fields
+    are kept and written back by `to_doc()`, so updating a document through a model doesn't lose them.
+    """
+
+    __slots__ = ('_extra',)
+
+    _id: Optional[str] = None
+    _rev: Optional[str] = None
+
+    def __init__(self, **kwargs):
+        codec = type(self)._compile()
+
+        for name, key, convert, spec in codec:
+            if name in kwargs:
+                value = convert(kwargs.pop(name))
+            elif spec.required:
+                raise ModelValidationError(f"{type(self).__name__}: field {name} is required")
+            else:
+                value = spec.get_default()
+
+            setattr(self, name, value)
+
+        if kwargs:
+            raise TypeError(f"{type(self).__name__}: unknown fields {', '.join(kwargs)}")
+
+        self._extra = None
+
+    @classmethod
+    def from_doc(cls: Type[T], doc: dict) -> T:
+        """Decodes and validates the document."""
+
+        if not isinstance(doc, dict):
+            raise ModelValidationError(f"{cls.__name__}: document should be an object, got {type(doc).__name__}")
+
+        codec = cls._compile()
+        obj = cls.__new__(cls)
+
+        for name, key, convert, spec in codec:
+            value = doc.get(key, MISSING)
+
+            if value is not MISSING:
+                value = convert(value)
+            elif spec.required:
+                raise ModelValidationError(f"{cls.__name__}: field {name} is required")
+            else:
+                value = spec.get_default()
+
+            setattr(obj, name, value)
+
+        keys = cls._keys
+        obj._extra = {k: v for k, v in doc.items() if k not in keys} or None
+
+        return obj
+
+    def to_doc(self) -> dict:
+        """Encodes the model into a document, `_id` and `_rev` are omitted if they are not set."""
+
+        doc = {}
+
+        for name, key, _, _ in type(self)._compile():
+            value = getattr(self, name)
+
+            if value is None and name in ('_id', '_rev'):
+                continue
+
+            doc[key] = _encode(value)
+
+        if self._extra:
+            doc.update(self._extra)
+
+        return doc
+
+    @classmethod
+    def from_docs(cls: Type[T], docs: Iterable[dict]) -> List[T]:
+        return [cls.from_doc(doc) for doc in docs]
+
+    @classmethod
+    def from_find(cls: Type[T], res: dict) -> List[T]:
+        """Decodes documents of a find result."""
+
+        return cls.from_docs(res['docs'])
+
+    @classmethod
+    def from_view(cls: Type[T], res: dict) -> List[T]:
+        """Decodes documents of a view result queried with `include_docs`, rows without documents are skipped."""
+
+        return [cls.from_doc(row['doc']) for row in res['rows'] if row.get('doc') is not None]
+
+    @classmethod
+    def from_bulk(cls: Type[T], results: List[dict]) -> List[T]:
+        """Decodes documents of a bulk get result, errors are skipped."""
+
+        return [cls.from_doc(item['ok']) for result in results for item in result['docs'] if 'ok' in item]
+
+    @classmethod
+    def _compile(cls) -> List[Tuple[str, str, Converter, Field]]:
+        codec = cls.__dict__.get('_codec')
+        if codec is not None:
+            return codec
+
+        hints = typing.get_type_hints(cls)
+        codec = []
+
+        for name, spec in cls._fields.items():
+            convert = _converter(hints.get(name, Any), f'{cls.__name__}.{name}')
+
+            if spec.validator is not None:
+                convert = _validated(convert, spec.validator, f'{cls.__name__}.{name}')
+
+            codec.append((name, spec.key or name, convert, spec))
+
+        cls._keys = frozenset(key for _, key, _, _ in codec)
+        cls._codec = codec
+        return codec
+
+    def __eq__(self, other: Any) -> bool:
+        if type(other) is not type(self):
+            return NotImplemented
+
+        return self.to_doc() == other.to_doc()
+
+    def __repr__(self) -> str:
+        fields = ', '.join(f'{name}={getattr(self, name)!r}' for name in type(self)._fields)
+        return f'{type(self).__name__}({fields})'
+
+
+def _encode(value: Any) -> Any:
+    if isinstance(value, Model):
+        return value.to_doc()
+
+    if isinstance(value, list):
+        return [_encode(v) for v in value]
+
+    if isinstance(value, dict):
+        return {k: _encode(v) for k, v in value.items()}
+
+    return value
+
+
+def _validated(convert: Converter, validator: Callable[[Any], bool], field: str) -> Converter:
+    def validate(value: Any) -> Any:
+        value = convert(value)
+
+        if not validator(value):
+            raise ModelValidationError(f"{field}: invalid value {value!r}")
+
+        return value
+
+    return validate
+
+
+def _identity(value: Any) -> Any:
+    return value
+
+
+def _converter(tp: Any, field: str) -> Converter:
+    if tp is Any or tp is object:
+        return _identity
+
+    origin = getattr(tp, '__origin__', None)
+    args = getattr(tp, '__args__', None) or ()
+
+    if origin is Union or (UnionType is not None and isinstance(tp, UnionType)):
+        return _union_converter(args, field)
+
+    if origin in (list, List):
+        return _list_converter(_converter(args[0], field) if args else _identity, field)
+
+    if origin in (dict, Dict):
+        return _dict_converter(_converter(args[1], field) if args else _identity, field)
+
+    if isinstance(tp, type) and issubclass(tp, Model):
+        def convert_model(value: Any) -> Any:
+            if isinstance(value, tp):
+                return value
+
+            return tp.from_doc(value)
+
+        return convert_model
+
+    if tp is float:
+        def convert_float(value: Any) -> Any:
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                raise ModelValidationError(f"{field}: expected float, got {type(value).__name__}")
+
+            return float(value)
+
+        return convert_float
+
+    if isinstance(tp, type):
+        # Bool is a subclass of int, but isn't a valid int value
+        excluded = bool if tp is int else ()
+
+        def convert_type(value: Any) -> Any:
+            if not isinstance(value, tp) or isinstance(value, excluded):
+                raise ModelValidationError(f"{field}: expected {tp.__name__}, got {type(value).__name__}")
+
+            return value
+
+        return convert_type
+
+    return _identity
+
+
+def _union_converter(args: tuple, field: str) -> Converter:
+    optional = type(None) in args
+    converters = [_converter(arg, field) for arg in args if arg is not type(None)]
+
+    if len(converters) == 1:
+        convert = converters[0]
+
+        def convert_optional(value: Any) -> Any:
+            return None if value is None and optional else convert(value)
+
+        return convert_optional
+
+    def convert_union(value: Any) -> Any:
+        if value is None and optional:
+            return None
+
+        for convert in converters:
+            try:
+                return convert(value)
+            except ModelValidationError:
+                pass
+
+        raise ModelValidationError(f"{field}: unexpected {type(value).__name__}")
+
+    return convert_union
+
+
+def _list_converter(convert: Converter, field: str) -> Converter:
+    def convert_list(value: Any) -> Any:
+        if not isinstance(value, list):
+            raise ModelValidationError(f"{field}: expected list, got {type(value).__name__}")
+
+        if convert is _identity:
+            return value
+
+        return [convert(v) for v in value]
+
+    return convert_list
+
+
+def _dict_converter(convert: Converter, field: str) -> Converter:
+    def convert_dict(value: Any) -> Any:
+        if not isinstance(value, dict):
+            raise ModelValidationError(f"{field}: expected dict, got {type(value).__name__}")
+
+        if convert is _identity:
+            return value
+
+        return {k: convert(v) for k, v in value.items()}
+
+    return convert_dict
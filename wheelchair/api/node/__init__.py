@@ -3,4 +3,5 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
+from .collector import NodeStatsCollector, NodeSample
 from .node import NodeProxy
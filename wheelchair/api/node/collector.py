@@ -0,0 +1,166 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, NamedTuple, Optional, Sequence
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..connection import Connection
+
+# Counters of the node's stats the rates are derived from
+RATE_COUNTERS = dict(
+    requests=('couchdb', 'httpd', 'requests'),
+    bulk_requests=('couchdb', 'httpd', 'bulk_requests'),
+    document_reads=('couchdb', 'database_reads'),
+    document_writes=('couchdb', 'database_writes'),
+    document_inserts=('couchdb', 'document_inserts'),
+)
+
+
+class NodeSample(NamedTuple):
+    timestamp: float
+    stats: dict
+    system: dict
+
+
+class NodeStatsCollector:
+    """\
+    Periodically polls statistics of every node of the cluster and keeps the last `max_samples` samples
+    of each node, so rates of the counters can be derived from them.
+
+    https://docs.couchdb.org/en/latest/api/server/common.html#get--_node-node-name-_stats
+    https://docs.couchdb.org/en/latest/api/server/common.html#get--_node-node-name-_system
+    """
+
+    def __init__(self, connection: 'Connection', *,
+                 interval: float = 10.0,
+                 max_samples: int = 360,
+                 nodes: Optional[Sequence[str]] = None):
+        assert max_samples > 1, "At least two samples are needed to derive rates"
+
+        self.__connection = connection
+        self.__interval = interval
+        self.__max_samples = max_samples
+        self.__nodes = list(nodes) if nodes is not None else None
+        self.__samples: Dict[str, Deque[NodeSample]] = {}
+        self.__errors: Dict[str, BaseException] = {}
+        self.__stopped = False
+
+    @property
+    def nodes(self) -> List[str]:
+        return list(self.__samples)
+
+    @property
+    def errors(self) -> Dict[str, BaseException]:
+        """Errors of the last poll by node name."""
+
+        return dict(self.__errors)
+
+    def samples(self, node: str) -> List[NodeSample]:
+        return list(self.__samples.get(node, ()))
+
+    def stop(self):
+        self.__stopped = True
+
+    async def run(self):
+        """Polls the nodes until `stop()` is called."""
+
+        self.__stopped = False
+
+        while not self.__stopped:
+            await self.collect()
+            await asyncio.sleep(self.__interval)
+
+    async def collect(self) -> Dict[str, NodeSample]:
+        """Polls all the nodes once, a failure of a node doesn't prevent polling the others."""
+
+        nodes = self.__nodes
+        if nodes is None:
+            res = await self.__connection.server.membership()
+            nodes = res['cluster_nodes']
+
+        results = await asyncio.gather(*(self._sample(node) for node in nodes), return_exceptions=True)
+
+        collected, self.__errors = {}, {}
+
+        for node, result in zip(nodes, results):
+            if isinstance(result, BaseException):
+                self.__errors[node] = result
+                continue
+
+            samples = self.__samples.get(node)
+            if samples is None:
+                samples = self.__samples[node] = deque(maxlen=self.__max_samples)
+
+            samples.append(result)
+            collected[node] = result
+
+        return collected
+
+    async def _sample(self, node: str) -> NodeSample:
+        stats, system = await asyncio.gather(self.__connection.node(node).stats(),
+                                             self.__connection.node(node).system())
+
+        return NodeSample(time.monotonic(), stats, system)
+
+    def rate(self, node: str, path: Sequence[str], window: int = 1) -> Optional[float]:
+        """\
+        Returns the per second rate of a counter, e.g. `('couchdb', 'httpd', 'requests')`,
+        between the last sample and the sample `window` samples before.
+
+        None is returned if there are not enough samples or the counter was reset by a node restart.
+        """
+
+        samples = self.__samples.get(node, ())
+        if len(samples) <= window:
+            return None
+
+        first, last = samples[-1 - window], samples[-1]
+
+        start, end = _value(first.stats, path), _value(last.stats, path)
+        elapsed = last.timestamp - first.timestamp
+
+        if start is None or end is None or end < start or elapsed <= 0:
+            return None
+
+        return (end - start) / elapsed
+
+    def summary(self, node: str, window: int = 1) -> Optional[dict]:
+        """\
+        Returns rates of the main counters, the request time histogram, memory usage and run queue
+        by the last sample of the node.
+        """
+
+        samples = self.__samples.get(node)
+        if not samples:
+            return None
+
+        last = samples[-1]
+
+        summary = {f'{name}_per_sec': self.rate(node, path, window) for name, path in RATE_COUNTERS.items()}
+        summary.update(
+            request_time=_value(last.stats, ('couchdb', 'request_time')),
+            status_codes={code: self.rate(node, ('couchdb', 'httpd_status_codes', code), window)
+                          for code in last.stats.get('couchdb', {}).get('httpd_status_codes', {})},
+            memory=last.system.get('memory'),
+            run_queue=last.system.get('run_queue'),
+            process_count=last.system.get('process_count'),
+            message_queues=last.system.get('message_queues'),
+        )
+
+        return summary
+
+
+def _value(stats: dict, path: Sequence[str]) -> Any:
+    for key in path:
+        if not isinstance(stats, dict) or key not in stats:
+            return None
+
+        stats = stats[key]
+
+    return stats.get('value') if isinstance(stats, dict) else stats
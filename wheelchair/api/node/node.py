@@ -54,9 +54,7 @@ class Node:
         https://docs.couchdb.org/en/latest/api/server/common.html#get--_node-node-name-_stats
         """
 
-        res = await self._connection.query('GET', ['_node', self._name, '_stats'])
-
-        return res['name']
+        return await self._connection.query('GET', ['_node', self._name, '_stats'])
 
     async def system(self) -> dict:
         """\
@@ -65,9 +63,7 @@ class Node:
         https://docs.couchdb.org/en/latest/api/server/common.html#get--_node-node-name-_system
         """
 
-        res = await self._connection.query('GET', ['_node', self._name, '_system'])
-
-        return res['name']
+        return await self._connection.query('GET', ['_node', self._name, '_system'])
 
     async def restart(self) -> dict:
         """\
@@ -0,0 +1,404 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import json
+import time
+from datetime import datetime, timezone
+from hashlib import md5
+from secrets import token_hex
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from typing import TYPE_CHECKING
+
+from ..database.changes import ChangesType
+from ..exceptions import NotFoundError
+
+if TYPE_CHECKING:
+    from ..database import Database
+
+MAX_HISTORY = 50
+
+# Marks a batch with documents failed to read, the checkpoint doesn't move past it
+_FAILED = object()
+
+
+class ReplicationStats:
+    __slots__ = ('missing_checked', 'missing_found', 'docs_read', 'doc_read_failures', 'docs_written',
+                 'doc_write_failures', 'last_seq', 'started')
+
+    def __init__(self):
+        self.missing_checked = 0
+        self.missing_found = 0
+        self.docs_read = 0
+        self.doc_read_failures = 0
+        self.docs_written = 0
+        self.doc_write_failures = 0
+        self.last_seq = None
+        self.started = time.monotonic()
+
+    def as_dict(self) -> dict:
+        return dict(
+            missing_checked=self.missing_checked,
+            missing_found=self.missing_found,
+            docs_read=self.docs_read,
+            doc_read_failures=self.doc_read_failures,
+            docs_written=self.docs_written,
+            doc_write_failures=self.doc_write_failures,
+        )
+
+
+class Replicator:
+    """\
+    Replicates documents from the source database into the target one by the client,
+    so the databases may live on isolated servers and documents may be transformed on the way.
+
+    The changes feed, revs_diff, `_bulk_get` and `_bulk_docs` stages run concurrently with bounded queues
+    between them. Progress is checkpointed in `_local` documents of both databases in the format used
+    by CouchDB, so an interrupted replication continues from the last checkpoint.
+
+    The transform gets every document before it is written and returns the document to write
+    or None to skip it.
+
+    Revisions failed to read from the source are fetched once more; if they still fail, they are counted
+    in `doc_read_failures` and the checkpoint isn't moved past their batch, so the next run replicates them again.
+    The continuous replication stops after such a batch, since it couldn't checkpoint anymore.
+
+    https://docs.couchdb.org/en/stable/replication/protocol.html
+    """
+
+    def __init__(self, source: 'Database', target: 'Database', *,
+                 selector: Optional[dict] = None,
+                 doc_ids: Optional[List[str]] = None,
+                 transform: Optional[Callable[[dict], Optional[dict]]] = None,
+                 batch_size: int = 500,
+                 batch_bytes: int = 4 << 20,
+                 workers: int = 4,
+                 checkpoint_interval: float = 5.0,
+                 continuous: bool = False,
+                 heartbeat: int = 30000):
+        assert batch_size > 0, "Batch size should be positive"
+        assert workers > 0, "Number of workers should be positive"
+
+        self.__source = source
+        self.__target = target
+        self.__selector = selector
+        self.__doc_ids = doc_ids
+        self.__transform = transform
+        self.__batch_size = batch_size
+        self.__batch_bytes = batch_bytes
+        self.__workers = workers
+        self.__checkpoint_interval = checkpoint_interval
+        self.__continuous = continuous
+        self.__heartbeat = heartbeat
+
+        self.__session_id = token_hex(16)
+        self.__stats = ReplicationStats()
+        self.__stopped = False
+
+        self.__source_log: Optional[dict] = None
+        self.__target_log: Optional[dict] = None
+        self.__start_seq: Any = 0
+        self.__start_time = ''
+        self.__completed: Dict[int, Any] = {}
+        self.__next_batch = 0
+        self.__recorded_batches = 0
+        self.__recorded_seq: Any = None
+        self.__checkpointed_seq: Any = None
+        self.__last_checkpoint = 0.0
+        self.__checkpoint_lock: Optional[asyncio.Lock] = None
+
+    @property
+    def source(self) -> 'Database':
+        return self.__source
+
+    @property
+    def target(self) -> 'Database':
+        return self.__target
+
+    @property
+    def stats(self) -> ReplicationStats:
+        return self.__stats
+
+    @property
+    def replication_id(self) -> str:
+        """Identifier of the replication, the checkpoints are stored in `_local/<replication_id>`."""
+
+        key = [
+            self.__source.connection.url + self.__source.name,
+            self.__target.connection.url + self.__target.name,
+            self.__selector,
+            self.__doc_ids,
+        ]
+
+        return md5(json.dumps(key, sort_keys=True).encode()).hexdigest()
+
+    def stop(self):
+        """Stops the continuous replication after the current batch."""
+
+        self.__stopped = True
+
+    async def __call__(self) -> ReplicationStats:
+        """\
+        Runs the replication until the target catches up with the source,
+        or until `stop()` is called for the continuous replication.
+        """
+
+        self.__session_id = token_hex(16)
+        self.__stats = ReplicationStats()
+        self.__stopped = False
+        self.__completed = {}
+        self.__next_batch = 0
+        self.__recorded_batches = 0
+        self.__checkpoint_lock = asyncio.Lock()
+
+        self.__start_time = _now()
+        self.__start_seq = await self._read_checkpoints()
+        self.__recorded_seq = self.__checkpointed_seq = self.__start_seq
+        self.__stats.last_seq = self.__start_seq
+        self.__last_checkpoint = time.monotonic()
+
+        changes = asyncio.Queue(maxsize=self.__workers * 2)
+        missing = asyncio.Queue(maxsize=self.__workers * 2)
+
+        stages = [asyncio.ensure_future(self._read_changes(changes)),
+                  asyncio.ensure_future(self._diff(changes, missing))]
+        stages += [asyncio.ensure_future(self._write(missing)) for _ in range(self.__workers)]
+
+        try:
+            await asyncio.gather(*stages)
+        finally:
+            for stage in stages:
+                stage.cancel()
+
+        await self._checkpoint(force=True)
+        return self.__stats
+
+    async def _read_changes(self, out: asyncio.Queue):
+        since = self.__start_seq
+
+        while True:
+            res = await self.__source.changes(
+                since=since,
+                limit=self.__batch_size,
+                style=ChangesType.all_docs,
+                selector=self.__selector,
+                doc_ids=self.__doc_ids,
+                timeout=self.__heartbeat if self.__continuous else None,
+            )
+
+            results, since = res['results'], res['last_seq']
+
+            if results:
+                await out.put((self.__next_batch, since, results))
+                self.__next_batch += 1
+
+            if self.__stopped or (not self.__continuous and (not results or not res.get('pending'))):
+                break
+
+        await out.put(None)
+
+    async def _diff(self, changes: asyncio.Queue, out: asyncio.Queue):
+        while True:
+            batch = await changes.get()
+
+            if batch is None:
+                for _ in range(self.__workers):
+                    await out.put(None)
+                return
+
+            index, seq, results = batch
+            revs = {row['id']: [c['rev'] for c in row['changes']] for row in results}
+
+            self.__stats.missing_checked += sum(len(r) for r in revs.values())
+            diff = await self.__target.revs_diff(revs)
+
+            docs = []
+            for _id, info in diff.items():
+                ancestors = info.get('possible_ancestors')
+                for rev in info['missing']:
+                    doc = dict(id=_id, rev=rev)
+                    if ancestors:
+                        doc['atts_since'] = ancestors
+                    docs.append(doc)
+
+            self.__stats.missing_found += len(docs)
+            await out.put((index, seq, docs))
+
+    async def _write(self, missing: asyncio.Queue):
+        while True:
+            batch = await missing.get()
+
+            if batch is None:
+                return
+
+            index, seq, docs = batch
+            ok = True
+
+            if docs:
+                docs, failures = await self._read_docs(docs)
+                await self._write_docs(docs)
+                ok = not failures
+
+            if not ok and self.__continuous:
+                # Later batches would wait for the failed one forever, so the replication is stopped
+                # to be restarted from the last checkpoint
+                self.stop()
+
+            await self._complete(index, seq if ok else _FAILED)
+
+    async def _read_docs(self, docs: List[dict]) -> Tuple[List[dict], int]:
+        res = await self.__source.bulk(docs, revs=True, attachments=True)
+        read, failed = self._collect_docs(res)
+
+        if failed:
+            # Errors may be transient, e.g. a node is unavailable, so the failed revisions are fetched once more
+            requested = {(doc['id'], doc['rev']): doc for doc in docs}
+            retry = [requested.get((_id, rev), dict(id=_id, rev=rev)) for _id, rev in failed]
+
+            res = await self.__source.bulk(retry, revs=True, attachments=True)
+            retried, failed = self._collect_docs(res)
+            read += retried
+
+        self.__stats.doc_read_failures += len(failed)
+        return read, len(failed)
+
+    def _collect_docs(self, results: List[dict]) -> Tuple[List[dict], List[Tuple[str, str]]]:
+        docs, failed = [], []
+
+        for result in results:
+            for item in result['docs']:
+                if 'ok' not in item:
+                    error = item.get('error') or {}
+                    failed.append((error.get('id', result.get('id')), error.get('rev')))
+                    continue
+
+                self.__stats.docs_read += 1
+                doc = item['ok']
+
+                if self.__transform is not None:
+                    doc = self.__transform(doc)
+
+                if doc is not None:
+                    docs.append(doc)
+
+        return docs, failed
+
+    async def _write_docs(self, docs: List[dict]):
+        for chunk in self._split(docs):
+            res = await self.__target.bulk.docs(chunk, new_edits=False)
+
+            failures = sum(1 for row in res if 'error' in row)
+            self.__stats.doc_write_failures += failures
+            self.__stats.docs_written += len(chunk) - failures
+
+    def _split(self, docs: List[dict]) -> List[List[dict]]:
+        chunks, chunk, size = [], [], 0
+
+        for doc in docs:
+            doc_size = len(json.dumps(doc))
+
+            if chunk and size + doc_size > self.__batch_bytes:
+                chunks.append(chunk)
+                chunk, size = [], 0
+
+            chunk.append(doc)
+            size += doc_size
+
+        if chunk:
+            chunks.append(chunk)
+
+        return chunks
+
+    async def _complete(self, index: int, seq: Any):
+        # Batches are written concurrently, so only a seq of the batch, all preceding batches
+        # of which are written too, can be recorded.
+        self.__completed[index] = seq
+
+        while self.__completed.get(self.__recorded_batches, _FAILED) is not _FAILED:
+            self.__recorded_seq = self.__completed.pop(self.__recorded_batches)
+            self.__recorded_batches += 1
+
+        self.__stats.last_seq = self.__recorded_seq
+
+        await self._checkpoint()
+
+    async def _read_checkpoints(self) -> Any:
+        _id = self.replication_id
+
+        self.__source_log = await self._get_log(self.__source, _id)
+        self.__target_log = await self._get_log(self.__target, _id)
+
+        if self.__source_log is None or self.__target_log is None:
+            return 0
+
+        return _compare_logs(self.__source_log, self.__target_log)
+
+    @staticmethod
+    async def _get_log(database: 'Database', _id: str) -> Optional[dict]:
+        try:
+            return await database.local(_id)
+        except NotFoundError:
+            return None
+
+    async def _checkpoint(self, force: bool = False):
+        if not force and time.monotonic() - self.__last_checkpoint < self.__checkpoint_interval:
+            return
+
+        # Workers and the final checkpoint would write the logs with the same revisions concurrently
+        async with self.__checkpoint_lock:
+            if self.__recorded_seq != self.__checkpointed_seq:
+                await self._write_checkpoint()
+
+    async def _write_checkpoint(self):
+        self.__last_checkpoint = time.monotonic()
+        seq = self.__recorded_seq
+
+        entry = dict(
+            session_id=self.__session_id,
+            start_time=self.__start_time,
+            end_time=_now(),
+            start_last_seq=self.__start_seq,
+            end_last_seq=seq,
+            recorded_seq=seq,
+            **self.__stats.as_dict(),
+        )
+
+        history = [h for h in (self.__source_log or {}).get('history', ()) if h['session_id'] != self.__session_id]
+        history = [entry] + history[:MAX_HISTORY - 1]
+
+        log = dict(
+            session_id=self.__session_id,
+            source_last_seq=seq,
+            replication_id_version=3,
+            history=history,
+        )
+
+        self.__source_log = await self._put_log(self.__source, log, self.__source_log)
+        self.__target_log = await self._put_log(self.__target, log, self.__target_log)
+        self.__checkpointed_seq = seq
+
+    async def _put_log(self, database: 'Database', log: dict, previous: Optional[dict]) -> dict:
+        rev = previous.get('_rev') if previous else None
+        res = await database.local.put(self.replication_id, log, rev=rev)
+        return dict(log, _id='_local/' + self.replication_id, _rev=res['rev'])
+
+
+def _compare_logs(source: dict, target: dict) -> Any:
+    """Finds the last sequence recorded by both databases."""
+
+    if source.get('session_id') == target.get('session_id'):
+        return source.get('source_last_seq', 0)
+
+    target_sessions = {h['session_id'] for h in target.get('history', ())}
+
+    for entry in source.get('history', ()):
+        if entry['session_id'] in target_sessions:
+            return entry['recorded_seq']
+
+    return 0
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).strftime('%a, %d %b %Y %H:%M:%S GMT')
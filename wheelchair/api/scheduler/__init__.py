@@ -3,4 +3,5 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
+from .monitor import SchedulerMonitor, ReplicationStatus
 from .scheduler import Scheduler
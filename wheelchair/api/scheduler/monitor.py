@@ -0,0 +1,191 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import time
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Optional, Union
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from .scheduler import Scheduler
+
+FAILED_STATES = {'crashing', 'failed', 'error'}
+
+# States of transient jobs are derived from the last event of the job's history
+_JOB_EVENT_STATES = {'added': 'pending', 'started': 'running', 'crashed': 'crashing', 'stopped': 'completed'}
+
+Callback = Callable[['ReplicationStatus', Optional['ReplicationStatus']], Union[None, Awaitable[None]]]
+
+
+class ReplicationStatus:
+    __slots__ = ('key', 'doc_id', 'job_id', 'source', 'target', 'state', 'docs_read', 'docs_written',
+                 'doc_write_failures', 'changes_pending', 'error', 'polled', 'docs_written_rate',
+                 'last_progress')
+
+    def __init__(self, key: str, doc_id: Optional[str], job_id: Optional[str], source: Any, target: Any,
+                 state: str, info: Optional[dict], error: Optional[str], polled: float):
+        info = info or {}
+
+        self.key = key
+        self.doc_id = doc_id
+        self.job_id = job_id
+        self.source = source
+        self.target = target
+        self.state = state
+        self.docs_read = info.get('docs_read', 0)
+        self.docs_written = info.get('docs_written', 0)
+        self.doc_write_failures = info.get('doc_write_failures', 0)
+        self.changes_pending = info.get('changes_pending')
+        self.error = error or info.get('error')
+        self.polled = polled
+        self.docs_written_rate = 0.0
+        self.last_progress = polled
+
+    def __repr__(self):
+        return f"<ReplicationStatus {self.key} {self.state} pending={self.changes_pending} " \
+               f"rate={self.docs_written_rate:.1f}/s>"
+
+
+class SchedulerMonitor:
+    """\
+    Periodically polls the replication scheduler and tracks the replications between polls:
+    documents written per second, pending changes and state transitions.
+
+    Callbacks get the current and the previous status of the replication and may be coroutines:
+    `on_transition` is called when the state changes, `on_crashing` when the replication enters
+    a crashing, failed or error state, `on_stalled` once when a running replication with pending changes
+    didn't write anything for `stall_timeout` seconds.
+
+    https://docs.couchdb.org/en/stable/api/server/common.html#get--_scheduler-docs
+    https://docs.couchdb.org/en/stable/api/server/common.html#get--_scheduler-jobs
+    """
+
+    def __init__(self, scheduler: 'Scheduler', *,
+                 interval: float = 10.0,
+                 page_size: int = 100,
+                 stall_timeout: float = 300.0,
+                 include_jobs: bool = True,
+                 on_transition: Optional[Callback] = None,
+                 on_crashing: Optional[Callback] = None,
+                 on_stalled: Optional[Callback] = None):
+        self.__scheduler = scheduler
+        self.__interval = interval
+        self.__page_size = page_size
+        self.__stall_timeout = stall_timeout
+        self.__include_jobs = include_jobs
+        self.__on_transition = on_transition
+        self.__on_crashing = on_crashing
+        self.__on_stalled = on_stalled
+        self.__statuses: Dict[str, ReplicationStatus] = {}
+        self.__stalled = set()
+        self.__stopped = False
+
+    @property
+    def statuses(self) -> Dict[str, ReplicationStatus]:
+        """Statuses of the replications by the last poll."""
+
+        return dict(self.__statuses)
+
+    def stop(self):
+        self.__stopped = True
+
+    async def run(self):
+        """Polls the scheduler until `stop()` is called."""
+
+        self.__stopped = False
+
+        while not self.__stopped:
+            await self.poll()
+            await asyncio.sleep(self.__interval)
+
+    async def poll(self) -> Dict[str, ReplicationStatus]:
+        """Takes a snapshot of the scheduler and compares it with the previous one."""
+
+        current = {}
+
+        async for status in self._snapshot():
+            current[status.key] = status
+
+        for key, status in current.items():
+            previous = self.__statuses.get(key)
+            await self._update(status, previous)
+
+        self.__stalled &= set(current)
+        self.__statuses = current
+        return dict(current)
+
+    async def _snapshot(self) -> AsyncGenerator[ReplicationStatus, None]:
+        polled = time.monotonic()
+        seen_jobs = set()
+
+        async for doc in self._paginate(self.__scheduler.docs, 'docs'):
+            key = f"{doc.get('database')}/{doc['doc_id']}"
+            if doc.get('id'):
+                seen_jobs.add(doc['id'])
+
+            yield ReplicationStatus(key, doc['doc_id'], doc.get('id'), doc.get('source'), doc.get('target'),
+                                    doc.get('state'), doc.get('info'), doc.get('error'), polled)
+
+        if not self.__include_jobs:
+            return
+
+        async for job in self._paginate(self.__scheduler.jobs, 'jobs'):
+            if job['id'] in seen_jobs or job.get('doc_id'):
+                continue
+
+            history = job.get('history') or [{}]
+            state = _JOB_EVENT_STATES.get(history[0].get('type'), 'running')
+
+            yield ReplicationStatus(job['id'], None, job['id'], job.get('source'), job.get('target'),
+                                    state, job.get('info'), None, polled)
+
+    async def _paginate(self, method: Callable[..., Awaitable[dict]], field: str) -> AsyncGenerator[dict, None]:
+        skip = 0
+
+        while True:
+            res = await method(limit=self.__page_size, skip=skip)
+            rows = res[field]
+
+            for row in rows:
+                yield row
+
+            skip += len(rows)
+
+            if not rows or skip >= res.get('total_rows', 0):
+                return
+
+    async def _update(self, status: ReplicationStatus, previous: Optional[ReplicationStatus]):
+        if previous is not None:
+            elapsed = status.polled - previous.polled
+            written = status.docs_written - previous.docs_written
+
+            if elapsed > 0 and written >= 0:
+                status.docs_written_rate = written / elapsed
+
+            status.last_progress = status.polled if written > 0 else previous.last_progress
+
+            if status.state != previous.state:
+                await _call(self.__on_transition, status, previous)
+
+        if status.state in FAILED_STATES and (previous is None or previous.state not in FAILED_STATES):
+            await _call(self.__on_crashing, status, previous)
+
+        stalled = previous is not None and status.state == 'running' and bool(status.changes_pending) and \
+            status.polled - status.last_progress >= self.__stall_timeout
+
+        if not stalled:
+            self.__stalled.discard(status.key)
+        elif status.key not in self.__stalled:
+            self.__stalled.add(status.key)
+            await _call(self.__on_stalled, status, previous)
+
+
+async def _call(callback: Optional[Callback], status: ReplicationStatus, previous: Optional[ReplicationStatus]):
+    if callback is None:
+        return
+
+    res = callback(status, previous)
+    if asyncio.iscoroutine(res) or isinstance(res, asyncio.Future):
+        await res
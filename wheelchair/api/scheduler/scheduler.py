@@ -5,6 +5,7 @@
 
 from typing import Optional
 
+from .monitor import SchedulerMonitor
 from ..utils import SimpleScope
 
 
@@ -45,3 +46,10 @@ class Scheduler(SimpleScope):
         """
 
         return await self._connection.query('GET', ['_scheduler', 'docs', replicator_db, doc_id])
+
+    def monitor(self, **kwargs) -> SchedulerMonitor:
+        """\
+        Monitor of the replication jobs, see `SchedulerMonitor` for the arguments.
+        """
+
+        return SchedulerMonitor(self, **kwargs)
@@ -3,4 +3,8 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
+from .active_tasks import ActiveTasksWatcher, TaskStatus
+from .bulk_replication import BulkReplication, DatabaseReplication
+from .compaction import CompactionScheduler, CompactionCandidate, CompactionResult
 from .server import Server
+from .uuid_pool import UUIDPool
@@ -0,0 +1,158 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import re
+import time
+from typing import Dict, Optional
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from ..connection import Connection
+
+_SHARD = re.compile(r'^shards/[0-9a-f]+-[0-9a-f]+/(.+)\.\d+$')
+
+
+class TaskStatus:
+    __slots__ = ('key', 'node', 'pid', 'type', 'database', 'design_document', 'doc_id', 'progress',
+                 'changes_pending', 'task', 'polled', 'rate', 'eta')
+
+    def __init__(self, task: dict, polled: float):
+        self.key = (task.get('node'), task.get('pid'))
+        self.node = task.get('node')
+        self.pid = task.get('pid')
+        self.type = task.get('type')
+        self.database = database_name(task.get('database'))
+        self.design_document = task.get('design_document')
+        self.doc_id = task.get('doc_id')
+        self.progress = task.get('progress')
+        self.changes_pending = task.get('changes_pending')
+        self.task = task
+        self.polled = polled
+        self.rate: Optional[float] = None
+        self.eta: Optional[float] = None
+
+    def matches(self, **match) -> bool:
+        return all(getattr(self, field) == value for field, value in match.items())
+
+    def __repr__(self):
+        return f"<TaskStatus {self.type} {self.database} progress={self.progress} eta={self.eta}>"
+
+
+class ActiveTasksWatcher:
+    """\
+    Polls the active tasks of the cluster and correlates them between polls to compute progress rates and ETAs
+    of compactions, view indexers and replications.
+
+    The rate is percents per second for the tasks reporting their progress, and documents read
+    per second for replications.
+
+    https://docs.couchdb.org/en/latest/api/server/common.html#active-tasks
+    """
+
+    def __init__(self, connection: 'Connection', *, interval: float = 5.0):
+        self.__connection = connection
+        self.__interval = interval
+        self.__tasks: Dict[tuple, TaskStatus] = {}
+        self.__poll: Optional[asyncio.Future] = None
+        self.__stopped = False
+
+    @property
+    def tasks(self) -> Dict[tuple, TaskStatus]:
+        """Tasks by the last poll, keyed by the node and the process id."""
+
+        return dict(self.__tasks)
+
+    def stop(self):
+        self.__stopped = True
+
+    async def run(self):
+        """Polls the active tasks until `stop()` is called."""
+
+        self.__stopped = False
+
+        while not self.__stopped:
+            await self.poll()
+            await asyncio.sleep(self.__interval)
+
+    async def poll(self) -> Dict[tuple, TaskStatus]:
+        """Polls the active tasks, concurrent calls share the same request."""
+
+        if self.__poll is None or self.__poll.done():
+            self.__poll = asyncio.ensure_future(self._poll())
+
+        return await asyncio.shield(self.__poll)
+
+    async def wait(self, *, start_timeout: float = 0.0, timeout: Optional[float] = None,
+                   **match) -> Optional[TaskStatus]:
+        """\
+        Waits until the task matching all the given fields, e.g. `type='indexer', design_document='_design/x'`,
+        completes and returns its last status.
+
+        If there is no such task, waits `start_timeout` seconds for it to start and returns None if it doesn't.
+        """
+
+        started = time.monotonic()
+        last = None
+
+        while True:
+            tasks = await self.poll()
+            current = next((task for task in tasks.values() if task.matches(**match)), None)
+
+            if current is not None:
+                last = current
+            elif last is not None or time.monotonic() - started >= start_timeout:
+                return last
+
+            if timeout is not None and time.monotonic() - started >= timeout:
+                raise asyncio.TimeoutError()
+
+            await asyncio.sleep(self.__interval)
+
+    async def _poll(self) -> Dict[tuple, TaskStatus]:
+        polled = time.monotonic()
+        tasks = {}
+
+        for task in await self.__connection.server.active_tasks():
+            status = TaskStatus(task, polled)
+            self._estimate(status, self.__tasks.get(status.key))
+            tasks[status.key] = status
+
+        self.__tasks = tasks
+        return dict(tasks)
+
+    @staticmethod
+    def _estimate(status: TaskStatus, previous: Optional[TaskStatus]):
+        task = status.task
+
+        if status.progress is not None:
+            if previous is not None and previous.progress is not None and status.polled > previous.polled:
+                status.rate = (status.progress - previous.progress) / (status.polled - previous.polled)
+            elif task.get('updated_on', 0) > task.get('started_on', 0):
+                # Not seen before, the average rate since the task started
+                status.rate = status.progress / (task['updated_on'] - task['started_on'])
+
+            if status.rate:
+                status.eta = max(100 - status.progress, 0) / status.rate
+
+        elif status.type == 'replication':
+            if previous is not None and status.polled > previous.polled:
+                read = task.get('docs_read', 0) - previous.task.get('docs_read', 0)
+                status.rate = max(read, 0) / (status.polled - previous.polled)
+
+            if status.changes_pending == 0:
+                status.eta = 0.0
+            elif status.rate and status.changes_pending is not None:
+                status.eta = status.changes_pending / status.rate
+
+
+def database_name(database: Optional[str]) -> Optional[str]:
+    """Returns the database name for a shard name, e.g. `shards/00000000-7fffffff/db.1612345678`."""
+
+    if database is None:
+        return None
+
+    match = _SHARD.match(database)
+    return match.group(1) if match else database
@@ -0,0 +1,198 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import time
+from fnmatch import fnmatchcase
+from secrets import token_hex
+from typing import Callable, Iterable, List, NamedTuple, Optional, Tuple, Union
+from typing import TYPE_CHECKING
+from urllib.parse import quote
+
+from ..exceptions import DocumentUpdateConflict, NotFoundError
+
+if TYPE_CHECKING:
+    from ..connection import Connection
+
+Endpoint = Union[str, Callable[[str], Union[str, dict]]]
+
+FINAL_STATES = {'completed', 'failed'}
+
+
+class DatabaseReplication(NamedTuple):
+    database: str
+    ok: bool
+    attempts: int
+    duration: float
+    docs_read: int
+    docs_written: int
+    doc_write_failures: int
+    error: Optional[str]
+
+
+class BulkReplication:
+    """\
+    Replicates many databases with a limited number of concurrent replications.
+
+    Every replication is a document of the replicator database, so it is run by the cluster's scheduler
+    and its completion is tracked by the scheduler state. Failed replications are retried;
+    a replication that keeps crashing is considered failed after `max_errors` errors.
+    Errors of requests, e.g. writing the replication document, fail the attempt the same way. If the bulk
+    replication is interrupted, the running replications are cancelled and their documents are removed.
+
+    The source and the target are either base URLs the database name is appended to,
+    or callables returning the endpoint (an URL or a dict with `url` and `headers`) for the database name.
+
+    https://docs.couchdb.org/en/stable/replication/replicator.html
+    """
+
+    def __init__(self, connection: 'Connection', source: Endpoint, target: Endpoint, *,
+                 replicator_db: str = '_replicator',
+                 concurrency: int = 4,
+                 retries: int = 2,
+                 retry_delay: float = 10.0,
+                 poll_interval: float = 5.0,
+                 max_errors: int = 3,
+                 timeout: Optional[float] = None,
+                 create_target: bool = True,
+                 options: Optional[dict] = None):
+        assert concurrency > 0, "Concurrency should be positive"
+
+        self.__connection = connection
+        self.__source = source
+        self.__target = target
+        self.__replicator_db = replicator_db
+        self.__concurrency = concurrency
+        self.__retries = retries
+        self.__retry_delay = retry_delay
+        self.__poll_interval = poll_interval
+        self.__max_errors = max_errors
+        self.__timeout = timeout
+        self.__create_target = create_target
+        self.__options = options or {}
+
+    async def __call__(self, databases: Union[str, Iterable[str]]) -> List[DatabaseReplication]:
+        """\
+        Replicates the databases and returns results in the same order.
+
+        A string is a shell-style pattern matched against names of all non-system databases of the server,
+        the names are fetched by pages and only the matching ones are kept.
+        """
+
+        if isinstance(databases, str):
+            pattern = databases
+            databases = [db async for db in self.__connection.server.iter_all_dbs()
+                         if not db.startswith('_') and fnmatchcase(db, pattern)]
+
+        semaphore = asyncio.Semaphore(self.__concurrency)
+        session = token_hex(8)
+
+        async def replicate(index: int, database: str) -> DatabaseReplication:
+            async with semaphore:
+                return await self.replicate(database, f'{session}-{index}')
+
+        tasks = [asyncio.ensure_future(replicate(i, db)) for i, db in enumerate(databases)]
+
+        try:
+            return list(await asyncio.gather(*tasks))
+        finally:
+            for task in tasks:
+                task.cancel()
+
+            # Cancelled replications remove their documents
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def replicate(self, database: str, doc_id: str) -> DatabaseReplication:
+        """Replicates a single database, retrying failures."""
+
+        started = time.monotonic()
+        error = None
+
+        for attempt in range(1, self.__retries + 2):
+            if attempt > 1:
+                await asyncio.sleep(self.__retry_delay)
+
+            attempt_id = f'{doc_id}-{attempt}'
+
+            try:
+                await self.__connection.db(self.__replicator_db).doc.put(attempt_id, self._replication_doc(database))
+                state, info, error = await self._wait(attempt_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                state, info, error = 'failed', {}, repr(e)
+            finally:
+                await self._cleanup(attempt_id)
+
+            if state == 'completed':
+                return DatabaseReplication(database, True, attempt, time.monotonic() - started,
+                                           info.get('docs_read', 0), info.get('docs_written', 0),
+                                           info.get('doc_write_failures', 0), None)
+
+        return DatabaseReplication(database, False, self.__retries + 1, time.monotonic() - started, 0, 0, 0, error)
+
+    def _replication_doc(self, database: str) -> dict:
+        doc = dict(self.__options)
+        doc.update(
+            source=_endpoint(self.__source, database),
+            target=_endpoint(self.__target, database),
+        )
+
+        if self.__create_target:
+            doc['create_target'] = True
+
+        return doc
+
+    async def _wait(self, doc_id: str) -> Tuple[str, dict, Optional[str]]:
+        started = time.monotonic()
+
+        while True:
+            await asyncio.sleep(self.__poll_interval)
+
+            try:
+                res = await self.__connection.scheduler.doc(self.__replicator_db, doc_id)
+            except NotFoundError:
+                # The scheduler hasn't picked up the document yet
+                res = dict(state='initializing')
+
+            state, info = res.get('state'), res.get('info') or {}
+            error = info.get('error') or res.get('error')
+
+            if state in FINAL_STATES:
+                return state, info, error
+
+            if state == 'crashing' and res.get('error_count', 0) >= self.__max_errors:
+                return 'failed', info, error
+
+            if self.__timeout is not None and time.monotonic() - started > self.__timeout:
+                return 'failed', info, error or 'timeout'
+
+    async def _cleanup(self, doc_id: str):
+        # Removing the document also cancels the replication if it is still running
+        replicator = self.__connection.db(self.__replicator_db)
+
+        for _ in range(3):
+            try:
+                doc = await replicator.doc(doc_id)
+                await replicator.doc.delete(doc_id, doc['_rev'])
+            except NotFoundError:
+                return
+            except DocumentUpdateConflict:
+                # The scheduler has just updated the replication state
+                continue
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                # E.g. the server is unreachable, the cleanup shouldn't hide the result of the replication
+                continue
+
+            return
+
+
+def _endpoint(endpoint: Endpoint, database: str) -> Union[str, dict]:
+    if callable(endpoint):
+        return endpoint(database)
+
+    return endpoint.rstrip('/') + '/' + quote(database, safe='')
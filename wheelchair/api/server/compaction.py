@@ -0,0 +1,218 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import time
+from datetime import datetime, time as day_time
+from fnmatch import fnmatchcase
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple, Union
+from typing import TYPE_CHECKING
+
+from .active_tasks import ActiveTasksWatcher
+
+if TYPE_CHECKING:
+    from ..connection import Connection
+
+
+class CompactionCandidate(NamedTuple):
+    database: str
+    design: Optional[str]
+    file_size: int
+    active_size: int
+
+    @property
+    def wasted(self) -> int:
+        return max(self.file_size - self.active_size, 0)
+
+    @property
+    def ratio(self) -> float:
+        return self.file_size / self.active_size if self.active_size else float('inf')
+
+
+class CompactionResult(NamedTuple):
+    candidate: CompactionCandidate
+    ok: bool
+    duration: float
+    error: Optional[BaseException]
+
+
+class CompactionScheduler:
+    """\
+    Compacts the databases and the view indexes which are fragmented enough.
+
+    A database or a view index is a candidate when its file is at least `min_ratio` times bigger
+    than its active data and wastes at least `min_wasted` bytes. The most wasteful candidates are compacted
+    first, at most `concurrency` at once, and only within the time window if it is set; the candidates
+    left when the window closes are skipped. Completion of the compactions is tracked by the active tasks.
+    Unused view indexes of the databases having design documents are cleaned up after the compaction.
+
+    Design documents of at most `scan_concurrency` databases are inspected at once. Databases failed
+    to inspect or to clean up, e.g. deleted during the scan, are skipped and their errors are kept in `errors`.
+
+    https://docs.couchdb.org/en/stable/maintenance/compaction.html
+    """
+
+    def __init__(self, connection: 'Connection', *,
+                 databases: Optional[Union[str, Iterable[str]]] = None,
+                 min_ratio: float = 2.0,
+                 min_wasted: int = 16 << 20,
+                 concurrency: int = 2,
+                 window: Optional[Tuple[day_time, day_time]] = None,
+                 view_cleanup: bool = True,
+                 interval: float = 5.0,
+                 start_timeout: float = 30.0,
+                 scan_concurrency: int = 8):
+        assert concurrency > 0, "Concurrency should be positive"
+        assert scan_concurrency > 0, "Scan concurrency should be positive"
+
+        self.__connection = connection
+        self.__databases = databases
+        self.__min_ratio = min_ratio
+        self.__min_wasted = min_wasted
+        self.__concurrency = concurrency
+        self.__window = window
+        self.__view_cleanup = view_cleanup
+        self.__start_timeout = start_timeout
+        self.__scan_concurrency = scan_concurrency
+        self.__errors: Dict[str, BaseException] = {}
+        self.__watcher = ActiveTasksWatcher(connection, interval=interval)
+
+    @property
+    def errors(self) -> Dict[str, BaseException]:
+        """Errors of the databases skipped by the last run, by their names."""
+
+        return self.__errors
+
+    def in_window(self, now: Optional[datetime] = None) -> bool:
+        if self.__window is None:
+            return True
+
+        start, end = self.__window
+        current = (now or datetime.now()).time()
+
+        if start <= end:
+            return start <= current < end
+
+        # The window spans midnight
+        return current >= start or current < end
+
+    async def candidates(self) -> List[CompactionCandidate]:
+        """Returns the databases and the view indexes to compact, the most wasteful first."""
+
+        self.__errors = {}
+        semaphore = asyncio.Semaphore(self.__scan_concurrency)
+
+        async def inspect(database: str, info: dict) -> List[CompactionCandidate]:
+            candidates = []
+            candidate = CompactionCandidate(database, None, info['sizes']['file'], info['sizes']['active'])
+
+            if not info.get('compact_running') and self._fragmented(candidate):
+                candidates.append(candidate)
+
+            async with semaphore:
+                try:
+                    return candidates + await self._view_candidates(database)
+                except Exception as e:
+                    self.__errors[database] = e
+                    return []
+
+        tasks = []
+
+        try:
+            async for row in self._dbs_info():
+                if row.get('info') is not None:
+                    tasks.append(asyncio.ensure_future(inspect(row['key'], row['info'])))
+
+            candidates = [c for res in await asyncio.gather(*tasks) for c in res]
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        candidates.sort(key=lambda c: c.wasted, reverse=True)
+        return candidates
+
+    async def __call__(self) -> List[CompactionResult]:
+        """Compacts the candidates, returns results of the started compactions."""
+
+        candidates = await self.candidates()
+        semaphore = asyncio.Semaphore(self.__concurrency)
+
+        async def compact(candidate: CompactionCandidate) -> Optional[CompactionResult]:
+            async with semaphore:
+                if not self.in_window():
+                    return None
+
+                return await self.compact(candidate)
+
+        results = await asyncio.gather(*(compact(c) for c in candidates))
+        results = [r for r in results if r is not None]
+
+        if self.__view_cleanup:
+            for database in {r.candidate.database for r in results if r.candidate.design is None}:
+                try:
+                    if await self._has_designs(database):
+                        await self.__connection.db(database).view_cleanup()
+                except Exception as e:
+                    self.__errors[database] = e
+
+        return results
+
+    async def compact(self, candidate: CompactionCandidate) -> CompactionResult:
+        """Compacts a database or a view index and waits for the compaction to complete."""
+
+        started = time.monotonic()
+        database = self.__connection.db(candidate.database)
+
+        try:
+            if candidate.design is None:
+                await database.compact()
+                await self.__watcher.wait(type='database_compaction', database=candidate.database,
+                                          start_timeout=self.__start_timeout)
+            else:
+                await database.design(candidate.design).compact()
+                await self.__watcher.wait(type='view_compaction', database=candidate.database,
+                                          design_document='_design/' + candidate.design,
+                                          start_timeout=self.__start_timeout)
+        except Exception as e:
+            return CompactionResult(candidate, False, time.monotonic() - started, e)
+
+        return CompactionResult(candidate, True, time.monotonic() - started, None)
+
+    def _fragmented(self, candidate: CompactionCandidate) -> bool:
+        return candidate.ratio >= self.__min_ratio and candidate.wasted >= self.__min_wasted
+
+    async def _dbs_info(self):
+        databases = self.__databases
+
+        if databases is None or isinstance(databases, str):
+            async for row in self.__connection.server.iter_dbs_info():
+                if databases is None or fnmatchcase(row['key'], databases):
+                    yield row
+            return
+
+        databases = list(databases)
+        for i in range(0, len(databases), 100):
+            for row in await self.__connection.server.dbs_info(databases[i:i + 100]):
+                yield row
+
+    async def _design_names(self, database: str) -> List[str]:
+        res = await self.__connection.db(database).all_docs(start_key='_design/', end_key='_design0')
+        return [row['id'][len('_design/'):] for row in res['rows']]
+
+    async def _has_designs(self, database: str) -> bool:
+        return bool(await self._design_names(database))
+
+    async def _view_candidates(self, database: str) -> List[CompactionCandidate]:
+        candidates = []
+
+        for design in await self._design_names(database):
+            info = (await self.__connection.db(database).design(design)())['view_index']
+
+            candidate = CompactionCandidate(database, design, info['sizes']['file'], info['sizes']['active'])
+
+            if not info.get('compact_running') and self._fragmented(candidate):
+                candidates.append(candidate)
+
+        return candidates
@@ -3,8 +3,12 @@
 # Wheelchair is released under the MIT License (see LICENSE).
 
 
-from typing import Optional, Union, List
+import asyncio
+import json
+from collections import deque
+from typing import AsyncGenerator, Iterable, Optional, Union, List
 
+from .bulk_replication import BulkReplication, DatabaseReplication, Endpoint
 from ..utils import SimpleScope
 
 
@@ -58,6 +62,76 @@ class Server(SimpleScope):
 
         return await self._connection.query('POST', ['_dbs_info'], data=dict(keys=keys))
 
+    async def iter_all_dbs(self, start_key: Optional[str] = None, end_key: Optional[str] = None, *,
+                           page_size: int = 1000) -> AsyncGenerator[str, None]:
+        """\
+        Iterates over names of the databases, fetching them by pages.
+
+        https://docs.couchdb.org/en/latest/api/server/common.html#get--_all_dbs
+        """
+
+        assert page_size > 0, "Page size should be positive"
+
+        skip = None
+        end_key = json.dumps(end_key) if end_key is not None else None
+
+        while True:
+            # Unlike lists and dicts, strings aren't encoded as JSON by the connection
+            page = await self.all_dbs(start_key=json.dumps(start_key) if start_key is not None else None,
+                                      end_key=end_key, skip=skip, limit=page_size)
+
+            for name in page:
+                yield name
+
+            if len(page) < page_size:
+                return
+
+            # The next page starts after the last name of this one
+            start_key, skip = page[-1], 1
+
+    async def iter_dbs_info(self, start_key: Optional[str] = None, end_key: Optional[str] = None, *,
+                            page_size: int = 1000,
+                            batch_size: int = 100,
+                            concurrency: int = 4) -> AsyncGenerator[dict, None]:
+        """\
+        Iterates over info of all the databases in order of their names.
+
+        Names are requested by pages and their info by batches of `batch_size` databases,
+        at most `concurrency` batches at once.
+
+        https://docs.couchdb.org/en/latest/api/server/common.html#post--_dbs_info
+        """
+
+        assert batch_size > 0, "Batch size should be positive"
+        assert concurrency > 0, "Concurrency should be positive"
+
+        pending = deque()
+        batch = []
+
+        try:
+            async for name in self.iter_all_dbs(start_key, end_key, page_size=page_size):
+                batch.append(name)
+
+                if len(batch) < batch_size:
+                    continue
+
+                pending.append(asyncio.ensure_future(self.dbs_info(batch)))
+                batch = []
+
+                if len(pending) >= concurrency:
+                    for info in await pending.popleft():
+                        yield info
+
+            if batch:
+                pending.append(asyncio.ensure_future(self.dbs_info(batch)))
+
+            while pending:
+                for info in await pending.popleft():
+                    yield info
+        finally:
+            for future in pending:
+                future.cancel()
+
     async def membership(self) -> dict:
         """\
         Returns list of the cluster nodes.
@@ -95,6 +169,16 @@ class Server(SimpleScope):
 
         return await self._connection.query('POST', ['_replicate'], data=data)
 
+    async def replicate_many(self, databases: Union[str, Iterable[str]], source: Endpoint, target: Endpoint,
+                             **kwargs) -> List[DatabaseReplication]:
+        """\
+        Replicate many databases through the replicator database, see `BulkReplication` for the arguments.
+
+        https://docs.couchdb.org/en/stable/replication/replicator.html
+        """
+
+        return await BulkReplication(self._connection, source, target, **kwargs)(databases)
+
     async def up(self) -> dict:
         """\
         Ping the node.
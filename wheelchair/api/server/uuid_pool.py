@@ -0,0 +1,178 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import asyncio
+import time
+from collections import deque
+from secrets import randbelow, token_hex
+from typing import Callable, Optional
+from typing import TYPE_CHECKING
+
+from ..exceptions import UUIDPoolExhausted
+from ..utils import backoff_delay
+
+if TYPE_CHECKING:
+    from ..connection import Connection
+
+# The default algorithm of the server
+DEFAULT_ALGORITHM = 'sequential'
+
+
+class UUIDPool:
+    """\
+    Pool of UUIDs generated by the server.
+
+    UUIDs are fetched by batches of `batch_size` and handed out synchronously; the pool is refilled
+    in the background when it drops below `low_water`. When the pool is empty, e.g. the server is unreachable,
+    UUIDs are generated locally by the fallback algorithm if it is set, otherwise UUIDPoolExhausted is raised.
+
+    With the `auto` fallback, the algorithm configured on the server is read on the first fill. If the config
+    can't be read, e.g. the user isn't an admin, the default `sequential` algorithm is used.
+
+    After a failed refill, `get` doesn't schedule the next one until a jittered exponential backoff
+    of `backoff` seconds, doubled by every failure up to `max_backoff`, has passed.
+
+    https://docs.couchdb.org/en/latest/api/server/common.html#get--_uuids
+    https://docs.couchdb.org/en/latest/config/misc.html#uuids-configuration
+    """
+
+    def __init__(self, connection: 'Connection', *,
+                 batch_size: int = 1000,
+                 low_water: int = 100,
+                 fallback: Optional[str] = None,
+                 backoff: float = 0.5,
+                 max_backoff: float = 30.0):
+        assert 0 <= low_water < batch_size, "Low water mark should be less than the batch size"
+        assert fallback in (None, 'auto') or fallback in _GENERATORS, f"Unknown UUID algorithm: {fallback}"
+
+        self.__connection = connection
+        self.__batch_size = batch_size
+        self.__low_water = low_water
+        self.__detect = fallback == 'auto'
+        self.__fallback: Optional[Callable[[], str]] = None
+
+        if fallback is not None and not self.__detect:
+            self.__fallback = _GENERATORS[fallback]()
+        self.__uuids = deque()
+        self.__refill: Optional[asyncio.Future] = None
+        self.__error: Optional[BaseException] = None
+        self.__backoff = backoff
+        self.__max_backoff = max_backoff
+        self.__failures = 0
+        self.__retry_at = 0.0
+
+    def __len__(self) -> int:
+        return len(self.__uuids)
+
+    @property
+    def fallback(self) -> bool:
+        """Whether UUIDs are generated locally when the pool is empty."""
+
+        return self.__fallback is not None
+
+    @property
+    def error(self) -> Optional[BaseException]:
+        """Error of the last refill, if it failed."""
+
+        return self.__error
+
+    def get(self) -> str:
+        """Returns a UUID, should be called within a running event loop to schedule refills."""
+
+        if len(self.__uuids) <= self.__low_water and time.monotonic() >= self.__retry_at:
+            self.refill()
+
+        if self.__uuids:
+            return self.__uuids.popleft()
+
+        if self.__fallback is not None:
+            return self.__fallback()
+
+        raise UUIDPoolExhausted("UUID pool is empty") from self.__error
+
+    def refill(self) -> asyncio.Future:
+        """Schedules a refill of the pool, unless one is already in progress."""
+
+        if self.__refill is None or self.__refill.done():
+            self.__refill = asyncio.ensure_future(self._refill())
+
+        return self.__refill
+
+    async def fill(self):
+        """Fetches a batch of UUIDs and waits for it, e.g. to warm the pool up."""
+
+        await self.refill()
+
+        if self.__error is not None:
+            raise self.__error
+
+    async def _refill(self):
+        if self.__detect:
+            self.__detect = False
+            self.__fallback = await self._detect_fallback()
+
+        try:
+            uuids = await self.__connection.server.uuids(self.__batch_size)
+        except Exception as e:
+            self.__error = e
+            self.__retry_at = time.monotonic() + backoff_delay(self.__failures, self.__backoff, self.__max_backoff)
+            self.__failures += 1
+            return
+
+        self.__error = None
+        self.__failures = 0
+        self.__retry_at = 0.0
+        self.__uuids.extend(uuids)
+
+    async def _detect_fallback(self) -> Callable[[], str]:
+        try:
+            config = await (await self.__connection.node().config())('uuids')
+        except Exception:
+            config = {}
+
+        algorithm = config.get('algorithm', DEFAULT_ALGORITHM)
+
+        if algorithm == 'utc_id':
+            return _utc_id(config.get('utc_id_suffix', ''))
+
+        return _GENERATORS.get(algorithm, _GENERATORS[DEFAULT_ALGORITHM])()
+
+
+def _random() -> Callable[[], str]:
+    return lambda: token_hex(16)
+
+
+def _sequential() -> Callable[[], str]:
+    # Random prefix with a monotonically increasing suffix, as the `sequential` algorithm of the server
+    prefix, suffix = token_hex(13), randbelow(0xfff)
+
+    def generate() -> str:
+        nonlocal prefix, suffix
+
+        suffix += randbelow(0xffe) + 1
+
+        if suffix > 0xffffff:
+            prefix, suffix = token_hex(13), randbelow(0xfff)
+
+        return f'{prefix}{suffix:06x}'
+
+    return generate
+
+
+def _utc_random() -> Callable[[], str]:
+    # Microseconds since the epoch followed by random hex, as the `utc_random` algorithm of the server
+    return lambda: f'{int(time.time() * 1000000):014x}{token_hex(9)}'
+
+
+def _utc_id(suffix: str) -> Callable[[], str]:
+    # Microseconds since the epoch followed by the configured suffix, as the `utc_id` algorithm of the server
+    return lambda: f'{int(time.time() * 1000000):014x}{suffix}'
+
+
+_GENERATORS = dict(
+    random=_random,
+    sequential=_sequential,
+    utc_random=_utc_random,
+)
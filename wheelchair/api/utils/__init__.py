@@ -7,3 +7,8 @@ from .query import Query, StreamRequest, StreamResponse
 from .simple_scope import SimpleScope
 from .stale_options import StaleOptions
 from .raw_collation import RAW_COLLATION
+from .collation import collation_key
+from .fields import MISSING, split_field, get_field
+from .selector import Selector
+from .backoff import backoff_delay
+from .canonical import canonical_hash, is_unchanged
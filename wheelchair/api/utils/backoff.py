@@ -0,0 +1,12 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import random
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: a random delay up to `base * 2 ** attempt`, but not above the cap."""
+
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
@@ -0,0 +1,31 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import json
+from hashlib import sha1
+
+# Metadata which differs between revisions of the same content
+_IGNORED_FIELDS = {'_id', '_rev', '_revisions', '_revs_info', '_conflicts', '_deleted_conflicts', '_local_seq'}
+
+
+def canonical_hash(doc: dict) -> str:
+    """Hashes the content of the document, so equal documents have equal hashes regardless of key order."""
+
+    content = {k: v for k, v in doc.items() if k not in _IGNORED_FIELDS}
+    data = json.dumps(content, sort_keys=True, separators=(',', ':'), ensure_ascii=False)
+
+    return sha1(data.encode()).hexdigest()
+
+
+def is_unchanged(doc: dict, current: dict) -> bool:
+    """Checks if writing the document over the current revision wouldn't change its content."""
+
+    if current.get('_deleted') or doc.get('_deleted'):
+        return False
+
+    if doc.get('_rev') is not None and doc['_rev'] != current.get('_rev'):
+        return False
+
+    return canonical_hash(doc) == canonical_hash(current)
@@ -0,0 +1,36 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+from typing import Any, Tuple
+
+_NULL, _FALSE, _TRUE, _NUMBER, _STRING, _ARRAY, _OBJECT = range(7)
+
+
+def collation_key(value: Any) -> Tuple:
+    """\
+    Returns a key that orders JSON values the way CouchDB collates them:
+    null, false, true, numbers, strings, arrays, objects.
+
+    Strings are compared by code points, not by the ICU rules used by the server.
+
+    https://docs.couchdb.org/en/stable/ddocs/views/collation.html#collation-specification
+    """
+
+    if value is None:
+        return _NULL,
+    if value is False:
+        return _FALSE,
+    if value is True:
+        return _TRUE,
+    if isinstance(value, (int, float)):
+        return _NUMBER, value
+    if isinstance(value, str):
+        return _STRING, value
+    if isinstance(value, (list, tuple)):
+        return _ARRAY, tuple(collation_key(v) for v in value)
+    if isinstance(value, dict):
+        return _OBJECT, tuple((k, collation_key(v)) for k, v in value.items())
+
+    raise TypeError(f"Value of type {type(value).__name__} is not a JSON value")
@@ -0,0 +1,50 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+from typing import Any, List, Sequence
+
+MISSING = object()
+
+
+def split_field(field: str) -> List[str]:
+    """\
+    Splits a Mango field name into path segments. A dot escaped by a backslash is a part of the segment.
+
+    https://docs.couchdb.org/en/stable/api/database/find.html#subfields
+    """
+
+    parts, current, escaped = [], [], False
+
+    for char in field:
+        if escaped:
+            current.append(char)
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif char == '.':
+            parts.append(''.join(current))
+            current = []
+        else:
+            current.append(char)
+
+    parts.append(''.join(current))
+    return parts
+
+
+def get_field(doc: Any, path: Sequence[str]) -> Any:
+    """Returns value of the field by the splitted path or MISSING if there is no such field."""
+
+    for part in path:
+        if isinstance(doc, dict):
+            doc = doc.get(part, MISSING)
+        elif isinstance(doc, list) and part.isdigit() and int(part) < len(doc):
+            doc = doc[int(part)]
+        else:
+            return MISSING
+
+        if doc is MISSING:
+            return MISSING
+
+    return doc
@@ -2,10 +2,11 @@
 # This file is part of Wheelchair, the async CouchDB connector.
 # Wheelchair is released under the MIT License (see LICENSE).
 
+import json
 from io import IOBase
-from typing import Union, List, Optional, NamedTuple, AsyncGenerator, Generator
+from typing import Union, List, Optional, NamedTuple, AsyncGenerator, Generator, Mapping
 
-from aiohttp import StreamReader
+from aiohttp import StreamReader, ClientResponse
 
 
 class StreamRequest(NamedTuple):
@@ -16,6 +17,23 @@ class StreamRequest(NamedTuple):
 class StreamResponse(NamedTuple):
     content_type: str
     stream: StreamReader
+    headers: Optional[Mapping[str, str]] = None
+    response: Optional[ClientResponse] = None
+
+    def release(self):
+        """Releases the underlying connection. Unread content is discarded."""
+
+        if self.response is not None:
+            self.response.release()
+
+    @property
+    def etag(self) -> Optional[str]:
+        return self.headers.get('ETag') if self.headers is not None else None
+
+    async def json(self):
+        """Reads the entire content and decodes it as JSON."""
+
+        return json.loads(await self.stream.read())
 
 
 class Query(NamedTuple):
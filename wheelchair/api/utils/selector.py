@@ -0,0 +1,263 @@
+# Copyright (C) 2019-2021 by Vd.
+# This file is part of Wheelchair, the async CouchDB connector.
+# Wheelchair is released under the MIT License (see LICENSE).
+
+
+import re
+from typing import Any, Callable, Iterable, Iterator, Optional
+
+from .collation import collation_key
+from .fields import MISSING, split_field, get_field
+
+Predicate = Callable[[Any], bool]
+
+_TYPES = (
+    (type(None), 'null'),
+    (bool, 'boolean'),
+    ((int, float), 'number'),
+    (str, 'string'),
+    (list, 'array'),
+    (dict, 'object'),
+)
+
+
+class Selector:
+    """\
+    Mango selector compiled into a predicate, so documents can be matched locally
+    the same way as the server does it for find requests.
+
+    Strings are compared by code points, not by the ICU rules used by the server, so comparisons
+    of strings may disagree with the server, e.g. for mixed-case or non-ASCII values.
+
+    https://docs.couchdb.org/en/stable/api/database/find.html#selector-syntax
+    """
+
+    __slots__ = ('__selector', '__predicate')
+
+    def __init__(self, selector: dict):
+        self.__selector = selector
+        self.__predicate = _compile_selector(selector)
+
+    @property
+    def selector(self) -> dict:
+        return self.__selector
+
+    def __call__(self, doc: dict) -> bool:
+        return self.__predicate(doc)
+
+    def filter(self, items: Iterable[Any], key: Optional[Callable[[Any], dict]] = None) -> Iterator[Any]:
+        """\
+        Yields items matching the selector. The key extracts the document from an item,
+        e.g. `lambda row: row['doc']` for the changes feed or view rows.
+        """
+
+        predicate = self.__predicate
+
+        if key is None:
+            return (item for item in items if predicate(item))
+
+        return (item for item in items if predicate(key(item)))
+
+
+def _compile_selector(selector: dict) -> Predicate:
+    if not isinstance(selector, dict):
+        raise TypeError(f"Selector should be a dict, got {type(selector).__name__}")
+
+    predicates = []
+
+    for key, arg in selector.items():
+        if key.startswith('$'):
+            predicates.append(_compile_operator(key, arg))
+        else:
+            predicates.append(_compile_field(split_field(key), arg))
+
+    return _all(predicates)
+
+
+def _compile_condition(arg: Any) -> Predicate:
+    if isinstance(arg, dict) and arg:
+        return _compile_selector(arg)
+
+    return _compile_operator('$eq', arg)
+
+
+def _compile_field(path: list, arg: Any) -> Predicate:
+    condition = _compile_condition(arg)
+    # Any condition fails on a missing field, except an explicit check for the absence.
+    missing = arg == {'$exists': False}
+
+    def match(value: Any) -> bool:
+        value = get_field(value, path)
+
+        if value is MISSING:
+            return missing
+
+        return condition(value)
+
+    return match
+
+
+def _all(predicates: list) -> Predicate:
+    if len(predicates) == 1:
+        return predicates[0]
+
+    return lambda value: all(p(value) for p in predicates)
+
+
+def _compile_operator(op: str, arg: Any) -> Predicate:
+    compiler = _OPERATORS.get(op)
+
+    if compiler is None:
+        raise ValueError(f"Unknown selector operator {op}")
+
+    return compiler(op, arg)
+
+
+def _compile_combination(op: str, arg: Any) -> Predicate:
+    if not isinstance(arg, list):
+        raise TypeError(f"Argument of {op} should be a list")
+
+    predicates = [_compile_condition(a) for a in arg]
+
+    if op == '$and':
+        return lambda value: all(p(value) for p in predicates)
+    if op == '$or':
+        return lambda value: any(p(value) for p in predicates)
+    return lambda value: not any(p(value) for p in predicates)
+
+
+def _compile_not(op: str, arg: Any) -> Predicate:
+    predicate = _compile_condition(arg)
+    return lambda value: not predicate(value)
+
+
+def _compile_compare(op: str, arg: Any) -> Predicate:
+    return _compile_comparison(op, collation_key(arg))
+
+
+def _compile_exists(op: str, arg: Any) -> Predicate:
+    return lambda value: bool(arg)
+
+
+def _compile_type(op: str, arg: Any) -> Predicate:
+    return lambda value: _type_name(value) == arg
+
+
+def _compile_in(op: str, arg: Any) -> Predicate:
+    if not isinstance(arg, list):
+        raise TypeError(f"Argument of {op} should be a list")
+
+    keys = frozenset(collation_key(a) for a in arg)
+
+    def contains(value: Any) -> bool:
+        # Elements of an array are matched, not the array itself
+        if isinstance(value, list):
+            return any(collation_key(v) in keys for v in value)
+        return collation_key(value) in keys
+
+    if op == '$in':
+        return contains
+    return lambda value: not contains(value)
+
+
+def _compile_size(op: str, arg: Any) -> Predicate:
+    return lambda value: isinstance(value, list) and len(value) == arg
+
+
+def _compile_mod(op: str, arg: Any) -> Predicate:
+    divisor, remainder = arg
+    if not isinstance(divisor, int) or not isinstance(remainder, int) or divisor == 0:
+        raise ValueError("Argument of $mod should be [divisor, remainder] with non zero integer divisor")
+
+    def mod(value: Any) -> bool:
+        if not isinstance(value, int) or isinstance(value, bool):
+            return False
+        # Erlang's rem keeps the sign of the dividend
+        rem = abs(value) % abs(divisor)
+        return (-rem if value < 0 else rem) == remainder
+
+    return mod
+
+
+def _compile_regex(op: str, arg: Any) -> Predicate:
+    pattern = re.compile(arg)
+    return lambda value: isinstance(value, str) and pattern.search(value) is not None
+
+
+def _compile_begins_with(op: str, arg: Any) -> Predicate:
+    return lambda value: isinstance(value, str) and value.startswith(arg)
+
+
+def _compile_all(op: str, arg: Any) -> Predicate:
+    if not isinstance(arg, list):
+        raise TypeError("Argument of $all should be a list")
+
+    if not arg:
+        # The server matches nothing by an empty $all
+        return lambda value: False
+
+    keys = frozenset(collation_key(a) for a in arg)
+    return lambda value: isinstance(value, list) and keys <= {collation_key(v) for v in value}
+
+
+def _compile_elem_match(op: str, arg: Any) -> Predicate:
+    predicate = _compile_condition(arg)
+    return lambda value: isinstance(value, list) and any(predicate(v) for v in value)
+
+
+def _compile_all_match(op: str, arg: Any) -> Predicate:
+    predicate = _compile_condition(arg)
+    return lambda value: isinstance(value, list) and bool(value) and all(predicate(v) for v in value)
+
+
+def _compile_key_map_match(op: str, arg: Any) -> Predicate:
+    predicate = _compile_condition(arg)
+    return lambda value: isinstance(value, dict) and any(predicate(k) for k in value)
+
+
+def _compile_comparison(op: str, key: tuple) -> Predicate:
+    if op == '$eq':
+        return lambda value: collation_key(value) == key
+    if op == '$ne':
+        return lambda value: collation_key(value) != key
+    if op == '$lt':
+        return lambda value: collation_key(value) < key
+    if op == '$lte':
+        return lambda value: collation_key(value) <= key
+    if op == '$gt':
+        return lambda value: collation_key(value) > key
+    return lambda value: collation_key(value) >= key
+
+
+_OPERATORS = {
+    '$and': _compile_combination,
+    '$or': _compile_combination,
+    '$nor': _compile_combination,
+    '$not': _compile_not,
+    '$eq': _compile_compare,
+    '$ne': _compile_compare,
+    '$lt': _compile_compare,
+    '$lte': _compile_compare,
+    '$gt': _compile_compare,
+    '$gte': _compile_compare,
+    '$exists': _compile_exists,
+    '$type': _compile_type,
+    '$in': _compile_in,
+    '$nin': _compile_in,
+    '$size': _compile_size,
+    '$mod': _compile_mod,
+    '$regex': _compile_regex,
+    '$beginsWith': _compile_begins_with,
+    '$all': _compile_all,
+    '$elemMatch': _compile_elem_match,
+    '$allMatch': _compile_all_match,
+    '$keyMapMatch': _compile_key_map_match,
+}
+
+
+def _type_name(value: Any) -> Optional[str]:
+    for types, name in _TYPES:
+        if isinstance(value, types):
+            return name
+
+    return None